@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import lzma
+import zlib
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+
+import bson
+from bson import Binary
+from pymongo import DeleteOne, ReplaceOne, ReturnDocument
+
+from cleanup_utils import LeaseLock
+from timestamp_utils import before
+
+logger = logging.getLogger("uvicorn.error")
+
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 9), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# Top-level keys copied next to the blob so archived resumes stay findable
+# by the same lookups as hot ones (GDPR export/deletion, key rotation)
+INDEXED_KEYS = ("id", "user_id", "user_email", "_email_bidx", "_key_id", "updated_at")
+
+
+class ResumeArchive:
+    """Cold storage for owned resumes left untouched: compressed BSON blobs in resumes_archive
+
+    Archived resumes are moved back into resumes the first time they are accessed.
+    """
+
+    def __init__(self, db_client, archive_after_days: int = 14, codec: str = "zlib", batch_size: int = 200):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive codec: {codec}")
+        self.db = db_client
+        self.archive_after = timedelta(days=archive_after_days)
+        self.codec = codec
+        self.batch_size = batch_size
+        self.lock = LeaseLock(db_client, "resume_archive")
+
+    async def ensure_indexes(self) -> None:
+        await self.db.resumes_archive.create_index("id", unique=True)
+        await self.db.resumes_archive.create_index("user_id")
+        await self.db.resumes_archive.create_index("_email_bidx", sparse=True)
+        await self.db.resumes.create_index("updated_at")
+
+    def _pack(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        doc = {k: v for k, v in doc.items() if k != "_id"}
+        compress, _ = CODECS[self.codec]
+        packed = {k: doc[k] for k in INDEXED_KEYS if k in doc}
+        packed.update({
+            "codec": self.codec,
+            "data": Binary(compress(bson.encode(doc))),
+            "archived_at": datetime.now(timezone.utc),
+        })
+        return packed
+
+    @staticmethod
+    def _unpack(archived: Dict[str, Any]) -> Dict[str, Any]:
+        _, decompress = CODECS[archived["codec"]]
+        return bson.decode(decompress(archived["data"]))
+
+    async def archive_stale(self) -> Optional[int]:
+        """Move owned resumes untouched for archive_after_days; None if another worker is on it"""
+        if not await self.lock.acquire():
+            return None
+        try:
+            cutoff = datetime.now(timezone.utc) - self.archive_after
+            # Anonymous resumes are left to their TTL expiry
+            query = {"$and": [
+                {"user_id": {"$nin": [None]}},
+                before("updated_at", cutoff),
+                # Recently restored resumes were just read; give them a full period before moving them again
+                {"$or": [{"restored_at": {"$exists": False}}, {"restored_at": {"$lt": cutoff}}]},
+            ]}
+            archived = 0
+            while True:
+                batch = await self.db.resumes.find(query).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                archived += await self._archive_batch(batch)
+                if len(batch) < self.batch_size:
+                    break
+                await self.lock.acquire()
+            if archived:
+                logger.info(f"Archived {archived} inactive resumes")
+            return archived
+        finally:
+            await self.lock.release()
+
+    async def _archive_batch(self, batch: List[Dict[str, Any]]) -> int:
+        # Write the archive copy first so a crash never loses a resume
+        await self.db.resumes_archive.bulk_write(
+            [ReplaceOne({"id": doc["id"]}, self._pack(doc), upsert=True) for doc in batch],
+            ordered=False,
+        )
+        # A resume edited since it was read stays hot
+        result = await self.db.resumes.bulk_write(
+            [DeleteOne({"_id": doc["_id"], "updated_at": doc.get("updated_at")}) for doc in batch],
+            ordered=False,
+        )
+        if result.deleted_count < len(batch):
+            still_hot = await self.db.resumes.distinct("id", {"id": {"$in": [doc["id"] for doc in batch]}})
+            await self.db.resumes_archive.delete_many({"id": {"$in": still_hot}})
+        return result.deleted_count
+
+    async def restore(self, resume_id: str) -> Optional[Dict[str, Any]]:
+        """Move an archived resume back to resumes and return it, or None if it isn't archived"""
+        archived = await self.db.resumes_archive.find_one({"id": resume_id})
+        if not archived:
+            return None
+        doc = self._unpack(archived)
+        doc["restored_at"] = datetime.now(timezone.utc)
+        # The stored document, with the _id callers (e.g. the read cache) key change events on
+        doc = await self.db.resumes.find_one_and_replace(
+            {"id": resume_id}, doc, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        await self.db.resumes_archive.delete_one({"_id": archived["_id"]})
+        return doc
+
+    async def restore_matching(self, query: Dict[str, Any]) -> int:
+        """Restore every archived resume matching a filter on the indexed keys"""
+        restored = 0
+        async for archived in self.db.resumes_archive.find(query, {"id": 1}):
+            if await self.restore(archived["id"]):
+                restored += 1
+        return restored
+
+    async def run_schedule(self, interval_seconds: float) -> None:
+        """Archive stale resumes every interval"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.archive_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Resume archiving failed: {str(e)}")
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from bson import json_util
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger("uvicorn.error")
+
+# Time and meta fields per audit collection, used by the time-series mode. The meta
+# field is what GDPR deletions filter on, since time-series deletes are meta-only.
+AUDIT_COLLECTIONS = {
+    "gdpr_deletions": {"timeField": "deletion_timestamp", "metaField": "user_identifier"},
+    "cleanup_log": {"timeField": "cleanup_date", "metaField": "user_id"},
+}
+
+COLLECTION_MODES = ("standard", "capped", "timeseries")
+
+
+class AuditWriter:
+    """Buffers audit records and writes them with insert_many on a size or time threshold
+
+    Batches that cannot be written within write_timeout_seconds are appended to a
+    local NDJSON file and replayed into Mongo once writes succeed again.
+    """
+
+    def __init__(self, db_client, max_batch: int = 100, flush_seconds: float = 2.0,
+                 write_timeout_seconds: float = 2.0, fallback_path: str = "audit_fallback.ndjson",
+                 collection_mode: str = "standard", capped_size_bytes: int = 256 * 1024 * 1024,
+                 retention_seconds: Optional[int] = None):
+        if collection_mode not in COLLECTION_MODES:
+            raise ValueError(f"Unknown audit collection mode: {collection_mode}")
+        self.db = db_client
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.write_timeout_seconds = write_timeout_seconds
+        self.fallback_path = fallback_path
+        self.collection_mode = collection_mode
+        self.capped_size_bytes = capped_size_bytes
+        self.retention_seconds = retention_seconds
+        self._buffer: Dict[str, List[Dict[str, Any]]] = {}
+        self._pending = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    async def ensure_collections(self) -> None:
+        """Create capped or time-series audit collections; existing collections are left as they are"""
+        if self.collection_mode == "standard":
+            return
+        existing = set(await self.db.list_collection_names())
+        for name, fields in AUDIT_COLLECTIONS.items():
+            if name in existing:
+                logger.info(f"Audit collection {name} already exists; not converting it to {self.collection_mode}")
+                continue
+            options: Dict[str, Any]
+            if self.collection_mode == "capped":
+                options = {"capped": True, "size": self.capped_size_bytes}
+            else:
+                options = {"timeseries": {**fields, "granularity": "hours"}}
+                if self.retention_seconds:
+                    options["expireAfterSeconds"] = self.retention_seconds
+            try:
+                await self.db.create_collection(name, **options)
+            except CollectionInvalid:
+                pass
+
+    def record(self, collection: str, doc: Dict[str, Any]) -> None:
+        """Queue a record; returns immediately"""
+        self._buffer.setdefault(collection, []).append(dict(doc))
+        self._pending += 1
+        if self._pending >= self.max_batch:
+            self._wakeup.set()
+
+    def record_many(self, collection: str, docs: List[Dict[str, Any]]) -> None:
+        for doc in docs:
+            self.record(collection, doc)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of records written to Mongo"""
+        async with self._flush_lock:
+            buffer, self._buffer, self._pending = self._buffer, {}, 0
+            written = 0
+            failed = False
+            for collection, docs in buffer.items():
+                try:
+                    await asyncio.wait_for(
+                        self.db[collection].insert_many(docs, ordered=False),
+                        timeout=self.write_timeout_seconds,
+                    )
+                    written += len(docs)
+                except Exception as e:
+                    # A timed-out insert may still land, so records are at-least-once
+                    failed = True
+                    logger.warning(f"Audit write to {collection} failed ({e}); spilling {len(docs)} records to {self.fallback_path}")
+                    self._spill(collection, docs)
+            if not failed and (os.path.exists(self.fallback_path) or os.path.exists(self.fallback_path + ".replay")):
+                written += await self._replay()
+            return written
+
+    def _spill(self, collection: str, docs: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.fallback_path)), exist_ok=True)
+        # Readable by the service account only
+        fd = os.open(self.fallback_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with open(fd, "a", encoding="utf-8") as f:
+            for doc in docs:
+                doc.pop("_id", None)
+                f.write(json_util.dumps({"collection": collection, "doc": doc}) + "\n")
+
+    async def _replay(self) -> int:
+        """Insert spilled records; the file is renamed first so new spills start a fresh one"""
+        replaying = self.fallback_path + ".replay"
+        if not os.path.exists(replaying):
+            os.replace(self.fallback_path, replaying)
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        with open(replaying, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json_util.loads(line)
+                    batches.setdefault(entry["collection"], []).append(entry["doc"])
+        for collection, docs in batches.items():
+            await self.db[collection].insert_many(docs, ordered=False)
+        os.remove(replaying)
+        replayed = sum(len(docs) for docs in batches.values())
+        logger.info(f"Replayed {replayed} spilled audit records")
+        return replayed
+
+    async def run_flush_loop(self) -> None:
+        """Flush every flush_seconds, or as soon as max_batch records are waiting"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Audit flush failed: {e}")
@@ -0,0 +1,72 @@
+"""Benchmark field-level (Fernet) vs envelope (AES-GCM) resume encryption.
+
+Usage: python bench_encryption.py [--docs 2000]
+
+Reports encrypt/decrypt throughput and the BSON size of the stored documents.
+"""
+import argparse
+import time
+import uuid
+
+import bson
+
+from encryption_utils import PrivacyEncryption
+
+
+def sample_resume(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "locale": "IN",
+        "contact": {
+            "full_name": f"Candidate Number {i}",
+            "email": f"candidate{i}@example.com",
+            "phone": f"+91 98765 {i:05d}",
+            "city": "Bengaluru",
+            "state": "KA",
+            "country": "India",
+            "linkedin": f"https://linkedin.com/in/candidate{i}",
+            "website": f"https://candidate{i}.dev",
+        },
+        "summary": "Backend engineer focused on APIs and data pipelines.",
+        "skills": ["python", "fastapi", "mongodb", "aws", "docker"],
+    }
+
+
+def run(mode: str, docs: list) -> dict:
+    encryption = PrivacyEncryption()
+    encryption.mode = mode
+
+    start = time.perf_counter()
+    encrypted = [encryption.encrypt_sensitive_data(d) for d in docs]
+    encrypt_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decrypted = [encryption.decrypt_sensitive_data(d) for d in encrypted]
+    decrypt_s = time.perf_counter() - start
+
+    assert decrypted[0]["contact"] == docs[0]["contact"]
+    stored = sum(len(bson.encode(d)) for d in encrypted)
+    return {
+        "mode": mode,
+        "encrypt_per_s": len(docs) / encrypt_s,
+        "decrypt_per_s": len(docs) / decrypt_s,
+        "avg_bytes": stored / len(docs),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=2000)
+    args = parser.parse_args()
+
+    docs = [sample_resume(i) for i in range(args.docs)]
+    plain = sum(len(bson.encode(d)) for d in docs) / len(docs)
+    print(f"{args.docs} resumes, plaintext avg {plain:.0f} bytes")
+    print(f"{'mode':<10}{'encrypt/s':>12}{'decrypt/s':>12}{'avg bytes':>12}")
+    for mode in ("field", "envelope"):
+        r = run(mode, docs)
+        print(f"{r['mode']:<10}{r['encrypt_per_s']:>12.0f}{r['decrypt_per_s']:>12.0f}{r['avg_bytes']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark resume request parsing against body size.
+
+Usage: python bench_request_parsing.py [--repeat 200] [--entries 1 5 20 50 100 200]
+
+Compares the dict path (json.loads, validate the dict as ResumeCreate, re-validate
+its dump as Resume) with the bytes path (validate_json on a cached TypeAdapter,
+then Resume.model_construct from the validated sections) used by POST /resumes.
+"""
+import argparse
+import json
+import time
+import uuid
+
+from serialization_utils import type_adapter
+from server import Resume, ResumeCreate
+
+
+def sample_body(entries: int) -> bytes:
+    return json.dumps({
+        "locale": "US",
+        "contact": {"full_name": "Candidate", "email": "candidate@example.com", "phone": "+1 555 0100"},
+        "summary": "Backend engineer focused on APIs and data pipelines.",
+        "skills": [f"skill{i}" for i in range(20)],
+        "experience": [
+            {
+                "id": str(uuid.uuid4()),
+                "company": f"Company {i}",
+                "title": "Engineer",
+                "start_date": "2018-01",
+                "bullets": [f"Delivered project {i}.{j}" for j in range(4)],
+            }
+            for i in range(entries)
+        ],
+        "education": [{"id": str(uuid.uuid4()), "institution": "UT Austin", "degree": "BS"}],
+    }).encode()
+
+
+def dict_path(body: bytes) -> Resume:
+    payload = ResumeCreate.model_validate(json.loads(body))
+    return Resume(**payload.dict(exclude_none=True))
+
+
+def bytes_path(body: bytes) -> Resume:
+    payload = type_adapter(ResumeCreate).validate_json(body)
+    return Resume.model_construct(**{k: v for k, v in payload if v is not None})
+
+
+def timed(fn, body: bytes, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(body)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1, 5, 20, 50, 100, 200])
+    args = parser.parse_args()
+
+    print(f"{'entries':>8}{'body KB':>10}{'dict us':>10}{'bytes us':>10}{'speedup':>10}")
+    for entries in args.entries:
+        body = sample_body(entries)
+        assert dict_path(body).model_dump(exclude={"id", "created_at", "updated_at"}) == \
+            bytes_path(body).model_dump(exclude={"id", "created_at", "updated_at"})
+        slow = timed(dict_path, body, args.repeat)
+        fast = timed(bytes_path, body, args.repeat)
+        print(f"{entries:>8}{len(body) / 1024:>10.1f}{slow:>10.0f}{fast:>10.0f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
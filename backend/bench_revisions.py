@@ -0,0 +1,110 @@
+"""Benchmark revision history storage: full copies vs snapshots plus JSON Patch deltas.
+
+Usage: python bench_revisions.py [--saves 500] [--snapshot-every 5 10 20 50]
+
+Simulates an autosave session (small edits to one section per save) and reports
+the stored bytes per revision and the latency of rebuilding a version, which
+grows with its distance from the nearest snapshot.
+"""
+import argparse
+import copy
+import random
+import statistics
+import time
+
+import bson
+
+from encryption_utils import PrivacyEncryption
+from revision_utils import RevisionStore, json_apply, json_diff
+
+
+def sample_content() -> dict:
+    return {
+        "locale": "IN",
+        "contact": {"full_name": "Candidate", "email": "candidate@example.com", "phone": "+91 98765 43210"},
+        "summary": "Backend engineer focused on APIs and data pipelines.",
+        "skills": ["python", "fastapi", "mongodb", "aws", "docker"],
+        "experience": [
+            {
+                "title": f"Engineer {i}",
+                "company": f"Company {i}",
+                "start_date": "2019-01",
+                "end_date": "2021-06",
+                "bullets": [f"Shipped feature {i}.{j} used by thousands of customers" for j in range(4)],
+            }
+            for i in range(6)
+        ],
+        "education": [{"degree": "B.Tech", "institution": "IIT", "year": "2018"}],
+    }
+
+
+def edit(content: dict, rng: random.Random) -> dict:
+    """One autosave: a few characters typed into a bullet, the summary or the skills"""
+    content = copy.deepcopy(content)
+    choice = rng.random()
+    if choice < 0.6:
+        job = rng.choice(content["experience"])
+        i = rng.randrange(len(job["bullets"]))
+        job["bullets"][i] += rng.choice(" abcdefghij")
+    elif choice < 0.9:
+        content["summary"] += rng.choice(" abcdefghij")
+    elif len(content["skills"]) < 30:
+        content["skills"].append(f"skill{len(content['skills'])}")
+    else:
+        content["skills"].pop(0)
+    return content
+
+
+def run(store: RevisionStore, history: list) -> dict:
+    revisions = []
+    chain = 0
+    for version, content in enumerate(history, start=1):
+        if version == 1 or chain + 1 >= store.snapshot_every:
+            chain = 0
+            revisions.append(store._pack("bench", version, "snapshot", content, 0, None))
+        else:
+            chain += 1
+            ops = json_diff(history[version - 2], content)
+            revisions.append(store._pack("bench", version, "delta", ops, chain, None))
+    stored = sum(len(bson.encode(r)) for r in revisions)
+
+    latencies = []
+    for version in range(1, len(history) + 1):
+        start = time.perf_counter()
+        base = max(i for i in range(version) if revisions[i]["kind"] == "snapshot")
+        content = store._unpack(revisions[base])
+        for revision in revisions[base + 1:version]:
+            content = json_apply(content, store._unpack(revision))
+        latencies.append(time.perf_counter() - start)
+        assert content == history[version - 1]
+    return {
+        "avg_bytes": stored / len(revisions),
+        "total_kb": stored / 1024,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--saves", type=int, default=500)
+    parser.add_argument("--snapshot-every", type=int, nargs="+", default=[5, 10, 20, 50])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    history = [sample_content()]
+    for _ in range(args.saves - 1):
+        history.append(edit(history[-1], rng))
+    store = RevisionStore(None, PrivacyEncryption())
+
+    full = sum(len(bson.encode(c)) for c in history)
+    print(f"{args.saves} saves, full copies avg {full / len(history):.0f} bytes, {full / 1024:.0f} KB total")
+    print(f"{'snapshot every':<16}{'avg bytes':>12}{'total KB':>12}{'p50 ms':>10}{'max ms':>10}")
+    for every in args.snapshot_every:
+        store.snapshot_every = every
+        r = run(store, history)
+        print(f"{every:<16}{r['avg_bytes']:>12.0f}{r['total_kb']:>12.0f}{r['p50_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark response serialization for a stored resume with 20 experience entries.
+
+Usage: python bench_serialization.py [--requests 2000]
+
+Compares the validated path (Resume(**doc) returned through response_model)
+with the fast path (shape() the trusted document, encode with orjson), both
+in-process and through a FastAPI test client for the full request/response.
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from serialization_utils import json_response, shape
+from server import Resume
+
+
+def sample_document() -> dict:
+    """A decrypted resume as read from Mongo"""
+    return {
+        "_id": "650000000000000000000000",
+        "id": str(uuid.uuid4()),
+        "locale": "US",
+        "created_at": datetime(2024, 1, 1, 12, 0),
+        "updated_at": datetime(2024, 6, 1, 12, 0),
+        "version": 42,
+        "user_id": str(uuid.uuid4()),
+        "user_email": "candidate@example.com",
+        "contact": {"full_name": "Candidate", "email": "candidate@example.com", "phone": "+1 555 0100",
+                    "city": "Austin", "state": "TX", "country": "USA"},
+        "summary": "Backend engineer focused on APIs and data pipelines. " * 4,
+        "skills": [f"skill{i}" for i in range(25)],
+        "experience": [
+            {
+                "id": str(uuid.uuid4()),
+                "company": f"Company {i}",
+                "title": "Senior Engineer",
+                "city": "Austin",
+                "start_date": "2018-01",
+                "end_date": "2020-06",
+                "bullets": [f"Delivered project {i}.{j}, cutting latency by {j * 10}%" for j in range(5)],
+            }
+            for i in range(20)
+        ],
+        "education": [{"id": str(uuid.uuid4()), "institution": "UT Austin", "degree": "BS CS", "start_date": "2012"}],
+        "projects": [{"id": str(uuid.uuid4()), "name": f"Project {i}", "tech": ["python"]} for i in range(5)],
+        "extras": {},
+        "ats": {"score": 90, "hints": []},
+        "_key_id": "k1",
+    }
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    doc = sample_document()
+    fields = {k: v for k, v in doc.items() if k in Resume.model_fields}
+    assert shape(Resume, doc) == Resume(**fields).model_dump()
+
+    app = FastAPI()
+
+    @app.get("/validated", response_model=Resume)
+    async def validated():
+        return Resume(**fields)
+
+    @app.get("/fast", response_model=Resume)
+    async def fast():
+        return json_response(shape(Resume, doc))
+
+    client = TestClient(app)
+    assert client.get("/validated").json() == client.get("/fast").json()
+
+    adapter = TypeAdapter(Resume)
+
+    def validated_in_process() -> bytes:
+        # What a response_model route does: dump the returned model, validate it again, dump to JSON
+        content = adapter.validate_python(Resume(**fields).model_dump())
+        return json.dumps(adapter.dump_python(content, mode="json")).encode()
+
+    n = args.requests
+    rows = [
+        ("in-process", "validated", timed(validated_in_process, n)),
+        ("in-process", "fast", timed(lambda: json_response(shape(Resume, doc)).body, n)),
+        ("request", "validated", timed(lambda: client.get("/validated"), n)),
+        ("request", "fast", timed(lambda: client.get("/fast"), n)),
+    ]
+    size = len(client.get("/fast").content)
+    print(f"resume with 20 experience entries, {size} bytes of JSON, {n} iterations")
+    print(f"{'scope':<12}{'path':<12}{'us/op':>10}")
+    for scope, path, us in rows:
+        print(f"{scope:<12}{path:<12}{us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
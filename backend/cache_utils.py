@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ResumeCache:
+    """In-process LRU of decrypted, encoded resumes, keyed by (id, version)
+
+    Every write bumps a resume's version, so a cached entry is served only while
+    Mongo still holds the same version: by default one indexed, projected lookup
+    of the version replaces the full read, decryption and model rebuild. While the
+    change stream is running (replica sets only) writes from other workers evict
+    entries as they happen and the version lookup is skipped.
+    """
+
+    def __init__(self, db_client, max_entries: int = 2000, recent_events: int = 10000):
+        self.db = db_client
+        self.max_entries = max_entries
+        self.recent_events = recent_events
+        # resume id -> (version, Mongo _id, cached value)
+        self._entries: "OrderedDict[str, Tuple[int, Any, Any]]" = OrderedDict()
+        # Mongo _id -> resume id; change events only carry the _id
+        self._ids: Dict[Any, str] = {}
+        # Mongo _id -> sequence number of its latest change event, for reads that raced a write
+        self._recent: "OrderedDict[Any, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+        # True while the change stream is open, i.e. while other workers' writes are seen
+        self.watching = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def token(self) -> int:
+        """Take before reading a resume from Mongo; put() refuses the read if it changed meanwhile"""
+        return self._sequence
+
+    async def get(self, resume_id: str) -> Optional[Any]:
+        """The cached resume if it is still the stored version, else None"""
+        entry = self._entries.get(resume_id)
+        if entry is not None and not self.watching:
+            stored = await self.db.resumes.find_one({"id": resume_id}, {"_id": 0, "version": 1})
+            if stored is None or stored.get("version", 0) != entry[0]:
+                self.invalidate(resume_id)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(resume_id)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, resume_id: str, version: int, value: Any, mongo_id: Any = None, token: Optional[int] = None) -> None:
+        """Cache a resume as read (or written) at version; an older version never replaces a newer one"""
+        if token is not None and (token < self._floor or self._recent.get(mongo_id, -1) > token):
+            # Changed (or possibly changed) since it was read
+            return
+        entry = self._entries.get(resume_id)
+        if entry is not None:
+            if entry[0] > version:
+                return
+            mongo_id = mongo_id if mongo_id is not None else entry[1]
+        if mongo_id is None and self.watching:
+            # Change events only name the _id; an entry without one would never be evicted
+            return
+        self._entries[resume_id] = (version, mongo_id, value)
+        self._entries.move_to_end(resume_id)
+        if mongo_id is not None:
+            self._ids[mongo_id] = resume_id
+        while len(self._entries) > self.max_entries:
+            _, (_, evicted_id, _) = self._entries.popitem(last=False)
+            self._ids.pop(evicted_id, None)
+
+    def invalidate(self, resume_id: str) -> None:
+        entry = self._entries.pop(resume_id, None)
+        if entry is not None:
+            self._ids.pop(entry[1], None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._ids.clear()
+        self._recent.clear()
+        self._sequence += 1
+        self._floor = self._sequence
+
+    def _changed(self, mongo_id: Any) -> None:
+        self._sequence += 1
+        self._recent[mongo_id] = self._sequence
+        self._recent.move_to_end(mongo_id)
+        while len(self._recent) > self.recent_events:
+            _, forgotten = self._recent.popitem(last=False)
+            self._floor = forgotten
+        resume_id = self._ids.get(mongo_id)
+        if resume_id is not None:
+            self.invalidate(resume_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "change_stream": self.watching,
+        }
+
+    async def run_invalidation_loop(self, retry_seconds: float = 5.0) -> None:
+        """Evict entries written by other workers, following a change stream on resumes
+
+        Needs a replica set (a single-node one is enough). Without one, or while the
+        stream is down, the cache falls back to checking versions on every read.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}}]
+        while True:
+            try:
+                async with self.db.resumes.watch(pipeline) as stream:
+                    # Events missed while not watching can't be replayed; start empty
+                    self.clear()
+                    self.watching = True
+                    logger.info("Resume cache is following the resumes change stream")
+                    async for change in stream:
+                        self._changed(change["documentKey"]["_id"])
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                logger.warning(f"Resume cache change stream unavailable ({e}); checking versions on read instead")
+                return
+            except PyMongoError as e:
+                logger.warning(f"Resume cache change stream interrupted: {e}")
+            finally:
+                self.watching = False
+            await asyncio.sleep(retry_seconds)
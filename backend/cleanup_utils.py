@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("uvicorn.error")
+
+CLEANUP_LOCK_NAME = "inactive_user_cleanup"
+
+
+class LeaseLock:
+    """Mongo lease lock; a holder that stops renewing loses it once the lease expires"""
+
+    def __init__(self, db_client, name: str, lease_seconds: int = 300):
+        self.db = db_client
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = str(uuid.uuid4())
+
+    async def acquire(self) -> bool:
+        """Take (or renew) the lease; False if another owner holds an unexpired one"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.job_locks.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The lock document exists and matched neither clause: held by someone else
+            return False
+
+    async def release(self) -> None:
+        await self.db.job_locks.delete_one({"_id": self.name, "owner": self.owner})
+
+
+class InactiveUserCleanup:
+    """Deletes inactive users and their resumes in indexed, checkpointed batches"""
+
+    def __init__(self, db_client, inactive_days: int = 30, batch_size: int = 500, lease_seconds: int = 300, audit=None,
+                 photos=None):
+        self.db = db_client
+        # AuditWriter; without one cleanup_log rows are inserted inline
+        self.audit = audit
+        # PhotoStore; deleted users' photos are released with them
+        self.photos = photos
+        self.inactive_days = inactive_days
+        self.batch_size = batch_size
+        self.lock = LeaseLock(db_client, CLEANUP_LOCK_NAME, lease_seconds)
+        self.reason = "inactive_for_1_month" if inactive_days == 30 else f"inactive_for_{inactive_days}_days"
+        # The lease is per process, so concurrent runs inside one process are guarded here
+        self._running = False
+
+    async def ensure_indexes(self) -> None:
+        """Index the activity fields the inactive-user query filters on"""
+        await self.db.users.create_index("last_activity_at")
+        await self.db.users.create_index("last_login_at")
+        await self.db.users.create_index("created_at")
+        await self.db.resumes.create_index("user_id")
+        await self.db.resumes.create_index("user_email", sparse=True)
+        await self.db.resumes_archive.create_index("user_id")
+        await self.db.resumes_archive.create_index("user_email", sparse=True)
+        await self.db.cleanup_runs.create_index("started_at")
+
+    def _inactive_query(self, cutoff: Any) -> Dict[str, Any]:
+        """Users whose every activity timestamp is older than cutoff, and who have at least one
+        
+        A recent value in any field keeps the account: a long-lived token is activity without a login.
+        """
+        from timestamp_utils import before, to_datetime
+        
+        cutoff = to_datetime(cutoff)
+        fields = ("last_activity_at", "last_login_at", "created_at")
+        return {
+            "$and": [
+                *({"$or": [{field: None}, *before(field, cutoff)["$or"]]} for field in fields),
+                {"$or": [{field: {"$ne": None}} for field in fields]},
+            ]
+        }
+
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """Run (or resume) a cleanup; returns None if another worker holds the lock"""
+        if self._running or not await self.lock.acquire():
+            logger.info("Inactive user cleanup skipped: another worker holds the lock")
+            return None
+        self._running = True
+        try:
+            run = await self._start_run()
+            return await self._process(run)
+        finally:
+            self._running = False
+            await self.lock.release()
+
+    async def _start_run(self) -> Dict[str, Any]:
+        # An interrupted run keeps its cutoff and checkpoint so it picks up where it stopped
+        run = await self.db.cleanup_runs.find_one({"status": "running"}, sort=[("started_at", -1)])
+        if run:
+            logger.info(f"Resuming inactive user cleanup {run['id']} after {run['deleted_users']} users")
+            return run
+
+        now = datetime.now(timezone.utc)
+        run = {
+            "id": str(uuid.uuid4()),
+            "status": "running",
+            "cutoff": now - timedelta(days=self.inactive_days),
+            "checkpoint": None,
+            "deleted_users": 0,
+            "deleted_resumes": 0,
+            "started_at": now,
+            "completed_at": None,
+        }
+        await self.db.cleanup_runs.insert_one(run)
+        return run
+
+    async def _process(self, run: Dict[str, Any]) -> Dict[str, Any]:
+        query = self._inactive_query(run["cutoff"])
+        checkpoint = run.get("checkpoint")
+        deleted_users = run["deleted_users"]
+        deleted_resumes = run["deleted_resumes"]
+
+        while True:
+            batch_query = query if checkpoint is None else {"$and": [query, {"_id": {"$gt": checkpoint}}]}
+            users = await self.db.users.find(batch_query, {"_id": 1, "id": 1, "email": 1}) \
+                .sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not users:
+                break
+
+            batch_users, batch_resumes = await self._delete_batch(users)
+            deleted_users += batch_users
+            deleted_resumes += batch_resumes
+            checkpoint = users[-1]["_id"]
+            await self.db.cleanup_runs.update_one(
+                {"id": run["id"]},
+                {"$set": {"checkpoint": checkpoint}, "$inc": {"deleted_users": batch_users, "deleted_resumes": batch_resumes}},
+            )
+            # Keep the lease alive for long runs
+            if not await self.lock.acquire():
+                raise RuntimeError("Lost the inactive user cleanup lock")
+
+        await self.db.cleanup_runs.update_one(
+            {"id": run["id"]},
+            {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc)}},
+        )
+        logger.info(f"Cleanup completed: {deleted_users} users and {deleted_resumes} resumes deleted")
+        return {"deleted_users": deleted_users, "deleted_resumes": deleted_resumes}
+
+    async def _delete_batch(self, users: List[Dict[str, Any]]) -> Tuple[int, int]:
+        user_ids = [u["id"] for u in users]
+        emails = [u["email"] for u in users]
+        owner_by_email = {u["email"]: u["id"] for u in users}
+        user_id_set = set(user_ids)
+        resume_query = {"$or": [{"user_id": {"$in": user_ids}}, {"user_email": {"$in": emails}}]}
+
+        # Per-user resume counts for the audit rows, one aggregation per collection;
+        # archived resumes keep user_id and user_email next to the blob, so the same filter finds them
+        per_user: Dict[str, int] = {}
+        resume_ids = set()
+        deleted_resumes = 0
+        for collection in (self.db.resumes, self.db.resumes_archive):
+            async for row in collection.aggregate([
+                {"$match": resume_query},
+                {"$group": {"_id": {"user_id": "$user_id", "user_email": "$user_email"}, "count": {"$sum": 1}}},
+            ]):
+                owner = row["_id"].get("user_id")
+                if owner not in user_id_set:
+                    owner = owner_by_email.get(row["_id"].get("user_email"))
+                per_user[owner] = per_user.get(owner, 0) + row["count"]
+            resume_ids.update(await collection.distinct("id", resume_query))
+            deleted_resumes += (await collection.delete_many(resume_query)).deleted_count
+        if resume_ids:
+            await self.db.resume_revisions.delete_many({"resume_id": {"$in": list(resume_ids)}})
+        user_result = await self.db.users.delete_many({"id": {"$in": user_ids}})
+        if self.photos:
+            await self.photos.release_owners(user_ids)
+
+        cleanup_date = datetime.now(timezone.utc)
+        rows = [
+            {
+                "action": "user_cleanup",
+                "user_id": u["id"],
+                "user_email": u["email"],
+                "resumes_deleted": per_user.get(u["id"], 0),
+                "cleanup_date": cleanup_date,
+                "reason": self.reason
+            }
+            for u in users
+        ]
+        if self.audit:
+            self.audit.record_many("cleanup_log", rows)
+        else:
+            await self.db.cleanup_log.insert_many(rows, ordered=False)
+        return user_result.deleted_count, deleted_resumes
+
+    async def run_schedule(self, interval_seconds: float) -> None:
+        """Run the cleanup every interval; each replica tries, the lock lets one through"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cleanup failed: {str(e)}")
@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from gdpr_utils import build_consent_record, consent_status
+
+
+class ConsentService:
+    """Consent status with a short-lived read cache; consents are written before they are acknowledged
+
+    The cache is per process: a consent recorded on one worker is seen by the others
+    once their cached status expires, i.e. within ttl_seconds.
+    """
+
+    def __init__(self, db_client, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        self.db = db_client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # identifier -> (expires_at monotonic, status)
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def _cached(self, user_identifier: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(user_identifier)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[user_identifier]
+            return None
+        self._cache.move_to_end(user_identifier)
+        return entry[1]
+
+    def _store(self, user_identifier: str, status: Dict[str, Any]) -> None:
+        self._cache[user_identifier] = (time.monotonic() + self.ttl_seconds, status)
+        self._cache.move_to_end(user_identifier)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def get(self, user_identifier: str) -> Dict[str, Any]:
+        """Consent status for one identifier"""
+        return (await self.get_many([user_identifier]))[0]
+
+    async def get_many(self, user_identifiers: Iterable[str]) -> List[Dict[str, Any]]:
+        """Consent status for many identifiers; cache misses are loaded with one $in query"""
+        identifiers = list(dict.fromkeys(user_identifiers))
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for identifier in identifiers:
+            status = self._cached(identifier)
+            if status is None:
+                missing.append(identifier)
+            else:
+                found[identifier] = status
+
+        if missing:
+            records = {}
+            cursor = self.db.privacy_consents.find({"user_identifier": {"$in": missing}}, {"_id": 0})
+            async for record in cursor:
+                records[record["user_identifier"]] = record
+            for identifier in missing:
+                # Unknown identifiers are cached too; the banner asks about them on every page
+                status = consent_status(identifier, records.get(identifier))
+                self._store(identifier, status)
+                found[identifier] = status
+        return [found[identifier] for identifier in identifiers]
+
+    async def record(self, user_identifier: str, consent_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a consent; it is stored in privacy_consents before this returns"""
+        consent_record = build_consent_record(user_identifier, consent_data)
+        await self.db.privacy_consents.update_one(
+            {"user_identifier": user_identifier}, {"$set": consent_record}, upsert=True
+        )
+        self._store(user_identifier, consent_status(user_identifier, consent_record))
+        return consent_record
+
+    def forget(self, user_identifiers: Iterable[str]) -> None:
+        """Drop cached consents, e.g. after a GDPR deletion"""
+        for identifier in user_identifiers:
+            self._cache.pop(identifier, None)
@@ -1,27 +1,161 @@
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import hashes, hmac
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap
 import base64
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import json
 
+# Envelope blob layout: version (1) | [key id length (1) | key id] | wrapped data key (40) | nonce (12) | AES-GCM ciphertext
+# Version 1 blobs carry no key id and were always sealed under the legacy key
+ENVELOPE_VERSION_LEGACY = b'\x01'
+ENVELOPE_VERSION = b'\x02'
+WRAPPED_KEY_SIZE = 40
+NONCE_SIZE = 12
+
+# Key id of the single key configured through RESUME_ENCRYPTION_KEY / ENCRYPTION_PASSWORD
+LEGACY_KEY_ID = 'k0'
+
+# Bookkeeping fields written next to the encrypted data; never part of a resume
+ENCRYPTION_MARKERS = ('_sealed', '_encrypted', '_key_id', '_email_bidx', '_content_hash', '_content_hashes')
+
+# Marks a field that is absent from (or should be removed from) a document
+MISSING = object()
+
+LeafFn = Callable[[str, Any, Tuple[int, ...]], Any]
+
+def leaf_key(path: str, index: Tuple[int, ...]) -> str:
+    """Flat key for one value of a path, e.g. 'references[].email#2'"""
+    if not index:
+        return path
+    return f"{path}#{'.'.join(str(i) for i in index)}"
+
+class FieldPathEngine:
+    """Compiles dotted field paths (e.g. 'contact.email', 'references[].phone') into one document walker
+    
+    transform() visits every configured leaf in a single pass and copies only the
+    containers whose values change.
+    """
+    
+    def __init__(self, paths):
+        self.paths = tuple(sorted(paths))
+        trie: Dict[str, Any] = {}
+        for path in self.paths:
+            node = trie
+            steps = self._parse(path)
+            for step in steps[:-1]:
+                node = node.setdefault(step, {})
+            node[steps[-1]] = path
+        self.sections = tuple(trie)
+        self._walk = self._compile(trie)
+    
+    @staticmethod
+    def _parse(path: str) -> List[str]:
+        steps = []
+        for part in path.split('.'):
+            if part.endswith('[]'):
+                steps.extend([part[:-2], '[]'])
+            else:
+                steps.append(part)
+        return steps
+    
+    def _compile(self, node: Dict[str, Any]) -> Callable[[Any, LeafFn, Tuple[int, ...]], Any]:
+        if '[]' in node:
+            child = node['[]']
+            walk_item = self._compile(child) if isinstance(child, dict) else None
+            
+            def walk_list(value: Any, fn: LeafFn, index: Tuple[int, ...]) -> Any:
+                if not isinstance(value, list):
+                    return value
+                out = None
+                for i, item in enumerate(value):
+                    new = walk_item(item, fn, index + (i,)) if walk_item else fn(child, item, index + (i,))
+                    if new is not item:
+                        if out is None:
+                            out = list(value)
+                        out[i] = new
+                return value if out is None else [v for v in out if v is not MISSING]
+            return walk_list
+        
+        steps = [(key, self._compile(child) if isinstance(child, dict) else child) for key, child in node.items()]
+        
+        def walk_dict(value: Any, fn: LeafFn, index: Tuple[int, ...]) -> Any:
+            if not isinstance(value, dict):
+                return value
+            out = None
+            for key, step in steps:
+                old = value.get(key, MISSING)
+                if isinstance(step, str):
+                    new = fn(step, old, index)
+                elif old is MISSING:
+                    continue
+                else:
+                    new = step(old, fn, index)
+                if new is not old:
+                    if out is None:
+                        out = value.copy()
+                    if new is MISSING:
+                        out.pop(key, None)
+                    else:
+                        out[key] = new
+            return value if out is None else out
+        return walk_dict
+    
+    def transform(self, document: Dict[str, Any], fn: LeafFn) -> Dict[str, Any]:
+        """Return document with fn(path, value, index) applied to every leaf slot
+        
+        value is MISSING for absent keys; returning MISSING removes the key.
+        """
+        return self._walk(document, fn, ())
+    
+    def extract(self, document: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Remove non-empty leaf values, returning them grouped by top-level section"""
+        payloads: Dict[str, Dict[str, Any]] = {}
+        
+        def take(path: str, value: Any, index: Tuple[int, ...]) -> Any:
+            if value is MISSING or not value:
+                return value
+            payloads.setdefault(path.split('.', 1)[0].split('[', 1)[0], {})[leaf_key(path, index)] = value
+            return MISSING
+        
+        return self.transform(document, take), payloads
+
 class PrivacyEncryption:
     """Handles field-level encryption for sensitive resume data"""
     
     def __init__(self):
-        # Get encryption key from environment or generate one
-        self.encryption_key = self._get_or_create_key()
-        self.fernet = Fernet(self.encryption_key)
+        # Keyring: every key can decrypt, only the active key encrypts
+        self.keys = self._load_keys()
+        self.active_key_id = os.environ.get('RESUME_ENCRYPTION_ACTIVE_KEY_ID') or list(self.keys)[-1]
+        if self.active_key_id not in self.keys:
+            raise ValueError(f"Unknown RESUME_ENCRYPTION_ACTIVE_KEY_ID: {self.active_key_id}")
+        self.encryption_key = self.keys[self.active_key_id]['key']
+        self.fernet = self.keys[self.active_key_id]['fernet']
+        
+        # "field" encrypts each value with Fernet; "envelope" seals them as one AEAD blob
+        self.mode = os.environ.get('RESUME_ENCRYPTION_MODE', 'field')
+        # Key-encryption key for envelope mode, derived once and cached
+        self.master_key = self.keys[self.active_key_id]['master_key']
         
-        # Define which fields need encryption
+        # Define which fields need encryption ("[]" walks every element of a list)
         self.sensitive_fields = {
             'contact.full_name',
             'contact.email', 
             'contact.phone',
             'contact.linkedin',
-            'contact.website'
+            'contact.website',
+            'contact.date_of_birth',
+            'contact.photo_url',
+            'references[].email',
+            'references[].phone'
         }
+        self.field_engine = FieldPathEngine(self.sensitive_fields)
+        
+        # Keyed hash of contact.email so encrypted resumes can still be found by email
+        self.blind_index_key = self._derive_blind_index_key()
     
     def _get_or_create_key(self) -> bytes:
         """Get encryption key from environment or generate new one"""
@@ -42,76 +176,216 @@ class PrivacyEncryption:
         key = base64.urlsafe_b64encode(kdf.derive(password))
         return key
     
+    def _load_keys(self) -> Dict[str, Dict[str, Any]]:
+        """Load the legacy key plus any keys from RESUME_ENCRYPTION_KEYS (\"id:key,id:key\")"""
+        raw_keys = [(LEGACY_KEY_ID, self._get_or_create_key())]
+        for entry in os.environ.get('RESUME_ENCRYPTION_KEYS', '').split(','):
+            if entry.strip():
+                key_id, key_str = entry.strip().split(':', 1)
+                raw_keys.append((key_id, key_str.encode()))
+        
+        keys = {}
+        for key_id, key in raw_keys:
+            keys[key_id] = {
+                'key': key,
+                'fernet': Fernet(key),
+                'master_key': self._derive_master_key(key),
+            }
+        return keys
+    
+    def _derive_master_key(self, encryption_key: bytes) -> bytes:
+        """Derive the envelope key-encryption key from the configured key"""
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'atlascv-envelope-kek',
+        )
+        return hkdf.derive(base64.urlsafe_b64decode(encryption_key))
+    
+    def _derive_blind_index_key(self) -> bytes:
+        """Blind-index key; independent of the active key so indexes survive rotation"""
+        key_str = os.environ.get('RESUME_BLIND_INDEX_KEY')
+        if key_str:
+            return key_str.encode()
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'atlascv-blind-index',
+        )
+        return hkdf.derive(base64.urlsafe_b64decode(self.keys[LEGACY_KEY_ID]['key']))
+    
+    def blind_index(self, value: Optional[str]) -> Optional[str]:
+        """Deterministic keyed hash of an identifier (case- and whitespace-insensitive)"""
+        if not value or not isinstance(value, str):
+            return None
+        mac = hmac.HMAC(self.blind_index_key, hashes.SHA256())
+        mac.update(value.strip().lower().encode())
+        return mac.finalize().hex()
+    
+    def content_hash(self, value: Any) -> str:
+        """Keyed hash of a value's canonical JSON; keyed so stored hashes reveal nothing about the content"""
+        mac = hmac.HMAC(self.blind_index_key, hashes.SHA256())
+        mac.update(b'content:')
+        mac.update(json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode())
+        return mac.finalize().hex()
+    
     def encrypt_sensitive_data(self, resume_data: Dict[str, Any]) -> Dict[str, Any]:
         """Encrypt sensitive fields in resume data"""
         if not resume_data:
             return resume_data
             
-        encrypted_data = resume_data.copy()
+        if self.mode == 'envelope':
+            return self._encrypt_envelope(resume_data)
         
-        # Encrypt contact information
-        if 'contact' in encrypted_data:
-            contact = encrypted_data['contact'].copy()
-            
-            if contact.get('full_name'):
-                contact['full_name'] = self._encrypt_field(contact['full_name'])
-            if contact.get('email'):
-                contact['email'] = self._encrypt_field(contact['email'])
-            if contact.get('phone'):
-                contact['phone'] = self._encrypt_field(contact['phone'])
-            if contact.get('linkedin'):
-                contact['linkedin'] = self._encrypt_field(contact['linkedin'])
-            if contact.get('website'):
-                contact['website'] = self._encrypt_field(contact['website'])
-                
-            encrypted_data['contact'] = contact
+        # One walk over every sensitive path; untouched containers are not copied
+        encrypted_data = self.field_engine.transform(
+            resume_data, lambda path, value, index: self._encrypt_field(value)
+        )
+        if encrypted_data is resume_data:
+            encrypted_data = resume_data.copy()
         
+        # Drop any envelope left by a previous mode; a $set would otherwise keep it
+        encrypted_data['_sealed'] = {}
         # Mark as encrypted for identification
         encrypted_data['_encrypted'] = True
+        encrypted_data['_key_id'] = self.active_key_id
+        encrypted_data['_email_bidx'] = self.blind_index((resume_data.get('contact') or {}).get('email'))
         return encrypted_data
     
-    def decrypt_sensitive_data(self, resume_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Decrypt sensitive fields in resume data"""
+    def _encrypt_envelope(self, resume_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Move sensitive fields into one sealed blob per top-level section"""
+        encrypted_data, payloads = self.field_engine.extract(resume_data)
+        if encrypted_data is resume_data:
+            encrypted_data = resume_data.copy()
+        
+        # Always written so that a $set replaces the previous envelope
+        encrypted_data['_sealed'] = {
+            section: self._seal(payload, self._aad(resume_data, section))
+            for section, payload in payloads.items()
+        }
+        encrypted_data['_encrypted'] = True
+        encrypted_data['_key_id'] = self.active_key_id
+        encrypted_data['_email_bidx'] = self.blind_index((resume_data.get('contact') or {}).get('email'))
+        return encrypted_data
+    
+    def encrypt_changes(self, resume_id: str, changes: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """Encrypt only the top-level sections in changes, as $set fields plus paths to $unset
+        
+        The rest of the document is left as stored, so it must already be under the
+        active key; callers guarantee that by filtering the update on _key_id.
+        """
+        encrypted = self.encrypt_sensitive_data({'id': resume_id, **changes})
+        sealed = encrypted['_sealed']
+        update = {k: v for k, v in encrypted.items() if k in changes}
+        unset = []
+        for section in self.field_engine.sections:
+            if section not in changes:
+                continue
+            # A section re-encrypted field by field must not keep an older sealed copy
+            if section in sealed:
+                update[f'_sealed.{section}'] = sealed[section]
+            else:
+                unset.append(f'_sealed.{section}')
+        if 'contact' in changes:
+            update['_email_bidx'] = encrypted['_email_bidx']
+        return update, unset
+    
+    def decrypt_sensitive_data(self, resume_data: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
+        """Decrypt sensitive fields in resume data (strict raises instead of keeping ciphertext)"""
         if not resume_data or not resume_data.get('_encrypted'):
             return resume_data
             
-        decrypted_data = resume_data.copy()
+        # Envelope format: open each sealed section
+        opened: Dict[str, Any] = {}
+        for section, blob in (resume_data.get('_sealed') or {}).items():
+            try:
+                opened.update(self._open(blob, self._aad(resume_data, section)))
+            except Exception:
+                if strict:
+                    raise
+                # If decryption fails, leave the section as stored
+                continue
         
-        # Decrypt contact information
-        if 'contact' in decrypted_data:
-            contact = decrypted_data['contact'].copy()
-            
-            if contact.get('full_name') and self._is_encrypted(contact['full_name']):
-                contact['full_name'] = self._decrypt_field(contact['full_name'])
-            if contact.get('email') and self._is_encrypted(contact['email']):
-                contact['email'] = self._decrypt_field(contact['email'])
-            if contact.get('phone') and self._is_encrypted(contact['phone']):
-                contact['phone'] = self._decrypt_field(contact['phone'])
-            if contact.get('linkedin') and self._is_encrypted(contact['linkedin']):
-                contact['linkedin'] = self._decrypt_field(contact['linkedin'])
-            if contact.get('website') and self._is_encrypted(contact['website']):
-                contact['website'] = self._decrypt_field(contact['website'])
-                
-            decrypted_data['contact'] = contact
-        
-        # Remove encryption marker
-        decrypted_data.pop('_encrypted', None)
+        # Restore sealed values and decrypt field-level values in the same walk
+        def decrypt_leaf(path: str, value: Any, index: Tuple[int, ...]) -> Any:
+            value = opened.get(leaf_key(path, index), value)
+            return self._decrypt_field(value, strict)
+        
+        decrypted_data = self.field_engine.transform(resume_data, decrypt_leaf)
+        if decrypted_data is resume_data:
+            decrypted_data = resume_data.copy()
+        
+        # Remove encryption markers
+        for marker in ENCRYPTION_MARKERS:
+            decrypted_data.pop(marker, None)
         return decrypted_data
     
+    def encrypt_many(self, resumes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Encrypt a batch of resumes"""
+        return [self.encrypt_sensitive_data(resume) for resume in resumes]
+    
+    def decrypt_many(self, resumes: List[Dict[str, Any]], strict: bool = False) -> List[Dict[str, Any]]:
+        """Decrypt a batch of resumes"""
+        return [self.decrypt_sensitive_data(resume, strict) for resume in resumes]
+    
+    def _aad(self, resume_data: Dict[str, Any], section: str) -> bytes:
+        """Bind a sealed blob to its document and section"""
+        return f"atlascv:{resume_data.get('id', '')}:{section}".encode()
+    
+    def seal_bytes(self, plaintext: bytes, aad: bytes) -> bytes:
+        """Encrypt raw bytes under a fresh data key wrapped by the master key"""
+        data_key = AESGCM.generate_key(bit_length=256)
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = AESGCM(data_key).encrypt(nonce, plaintext, aad)
+        key_id = self.active_key_id.encode()
+        return (
+            ENVELOPE_VERSION + bytes([len(key_id)]) + key_id
+            + aes_key_wrap(self.master_key, data_key) + nonce + ciphertext
+        )
+    
+    def open_bytes(self, blob: bytes, aad: bytes) -> bytes:
+        """Decrypt a blob produced by seal_bytes"""
+        if blob[:1] == ENVELOPE_VERSION:
+            key_id_end = 2 + blob[1]
+            key_id = blob[2:key_id_end].decode()
+        elif blob[:1] == ENVELOPE_VERSION_LEGACY:
+            key_id_end = 1
+            key_id = LEGACY_KEY_ID
+        else:
+            raise ValueError('Unsupported envelope version')
+        wrapped_end = key_id_end + WRAPPED_KEY_SIZE
+        nonce_end = wrapped_end + NONCE_SIZE
+        data_key = aes_key_unwrap(self.keys[key_id]['master_key'], blob[key_id_end:wrapped_end])
+        return AESGCM(data_key).decrypt(blob[wrapped_end:nonce_end], blob[nonce_end:], aad)
+    
+    def _seal(self, payload: Dict[str, Any], aad: bytes) -> bytes:
+        """Encrypt a payload under a fresh data key wrapped by the master key"""
+        return self.seal_bytes(json.dumps(payload, separators=(',', ':')).encode(), aad)
+    
+    def _open(self, blob: bytes, aad: bytes) -> Dict[str, Any]:
+        """Decrypt a blob produced by _seal"""
+        return json.loads(self.open_bytes(blob, aad))
+    
     def _encrypt_field(self, value: str) -> str:
         """Encrypt a single field value"""
         if not value or not isinstance(value, str):
             return value
-        return f"ENC:{self.fernet.encrypt(value.encode()).decode()}"
+        return f"ENC:{self.active_key_id}:{self.fernet.encrypt(value.encode()).decode()}"
     
-    def _decrypt_field(self, value: str) -> str:
+    def _decrypt_field(self, value: str, strict: bool = False) -> str:
         """Decrypt a single field value"""
         if not value or not isinstance(value, str) or not value.startswith('ENC:'):
             return value
         try:
-            encrypted_bytes = value[4:].encode()  # Remove 'ENC:' prefix
-            return self.fernet.decrypt(encrypted_bytes).decode()
+            # "ENC:<key id>:<token>"; legacy values are "ENC:<token>" (Fernet tokens contain no ':')
+            key_id, _, token = value[4:].rpartition(':')
+            fernet = self.keys[key_id or LEGACY_KEY_ID]['fernet']
+            return fernet.decrypt(token.encode()).decode()
         except Exception:
+            if strict:
+                raise
             # If decryption fails, return original value
             return value
     
@@ -123,9 +397,79 @@ class PrivacyEncryption:
         """Get privacy information about stored data"""
         return {
             'has_encrypted_data': resume_data.get('_encrypted', False),
+            'encryption_format': 'envelope' if resume_data.get('_sealed') else 'field',
+            'key_id': resume_data.get('_key_id', LEGACY_KEY_ID if resume_data.get('_encrypted') else None),
             'sensitive_fields_count': len(self.sensitive_fields),
             'encryption_status': 'enabled' if self.encryption_key else 'disabled'
         }
 
+    def view(self, resume_data: Dict[str, Any]) -> 'DecryptedResumeView':
+        """Wrap a stored resume for lazy, field-selective decryption"""
+        return DecryptedResumeView(resume_data, self)
+
+class DecryptedResumeView:
+    """Read view over a stored resume that decrypts sensitive fields on first access
+    
+    Decrypted values are cached on the view, so a view should live for one request.
+    """
+    
+    def __init__(self, resume_data: Dict[str, Any], encryption: PrivacyEncryption):
+        self.data = resume_data
+        self.encryption = encryption
+        self._plaintext: Dict[str, Any] = {}
+        self._opened_sections = set()
+    
+    def get(self, path: str, default: Any = None) -> Any:
+        """Return the value at a dotted path, decrypting it if it is sensitive (no '[]' paths)"""
+        stored = self._raw(path)
+        if path in self.encryption.sensitive_fields:
+            stored = self._leaf(path, (), stored)
+        return default if stored is MISSING else stored
+    
+    def _raw(self, path: str) -> Any:
+        value: Any = self.data
+        for key in path.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return MISSING
+            value = value[key]
+        return value
+    
+    def _leaf(self, path: str, index: Tuple[int, ...], stored: Any) -> Any:
+        key = leaf_key(path, index)
+        if key not in self._plaintext:
+            self._open_section(path.split('.', 1)[0].split('[', 1)[0])
+        if key not in self._plaintext:
+            self._plaintext[key] = self.encryption._decrypt_field(stored)
+        return self._plaintext[key]
+    
+    def _open_section(self, section: str) -> None:
+        """Open a section's envelope once; one AEAD operation yields all its fields"""
+        if section in self._opened_sections:
+            return
+        self._opened_sections.add(section)
+        blob = (self.data.get('_sealed') or {}).get(section)
+        if not blob:
+            return
+        try:
+            self._plaintext.update(self.encryption._open(blob, self.encryption._aad(self.data, section)))
+        except Exception:
+            # If decryption fails, fall back to the stored field values
+            pass
+    
+    def materialize(self, paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Build a plain resume dict; sensitive fields not listed in paths are left out
+        
+        With paths=None every sensitive field is decrypted.
+        """
+        requested = self.encryption.sensitive_fields if paths is None else set(paths)
+        
+        def pick(path: str, stored: Any, index: Tuple[int, ...]) -> Any:
+            if path not in requested:
+                return MISSING
+            return self._leaf(path, index, stored)
+        
+        result = {k: v for k, v in self.data.items() if k not in ENCRYPTION_MARKERS}
+        return self.encryption.field_engine.transform(result, pick)
+
 # Global instance
 privacy_encryption = PrivacyEncryption()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import io
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pandas as pd
+
+from encryption_utils import privacy_encryption
+
+# Sections exported as their own table, one row per entry
+SECTION_TABLES = ("experience", "education", "projects", "certifications", "references")
+
+# Fields needed to decrypt a projected resume
+DECRYPTION_FIELDS = ("id", "_encrypted", "_key_id")
+
+
+class _ZipSink:
+    """Write-only, unseekable file object; the generator drains what zipfile writes"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _cell(value: Any) -> Any:
+    """Flatten list values into a single CSV cell"""
+    if isinstance(value, list):
+        return "; ".join(str(v) for v in value)
+    return value
+
+
+class CsvZipExporter:
+    """Streams resumes as a ZIP of flattened CSV tables (resumes + one per section)"""
+
+    def __init__(self, db_client, resume_columns: List[str], section_columns: Dict[str, List[str]], chunk_size: int = 200):
+        self.db = db_client
+        self.resume_columns = resume_columns
+        self.section_columns = section_columns
+        self.chunk_size = chunk_size
+
+    async def stream(self, resume_filter: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """Yield ZIP bytes; each table is built from cursor-sized DataFrame chunks"""
+        sink = _ZipSink()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            async for chunk in self._write_table(archive, sink, "resumes", resume_filter, None):
+                yield chunk
+            for section in SECTION_TABLES:
+                async for chunk in self._write_table(archive, sink, section, resume_filter, section):
+                    yield chunk
+        yield sink.drain()
+
+    def _projection(self, section: Optional[str]) -> Dict[str, Any]:
+        sealed_sections = privacy_encryption.field_engine.sections
+        if section is None:
+            # Everything except the per-section lists
+            return {"_id": 0, **{s: 0 for s in SECTION_TABLES}}
+        projection = {"_id": 0, section: 1}
+        if section in sealed_sections:
+            projection.update({field: 1 for field in DECRYPTION_FIELDS})
+            projection[f"_sealed.{section}"] = 1
+        else:
+            projection["id"] = 1
+        return projection
+
+    def _section_rows(self, docs: List[Dict[str, Any]], section: str) -> List[Dict[str, Any]]:
+        rows = []
+        for doc in docs:
+            for entry in doc.get(section) or []:
+                rows.append({"resume_id": doc.get("id"), **{k: _cell(v) for k, v in entry.items()}})
+        return rows
+
+    def _columns(self, section: Optional[str]) -> List[str]:
+        if section is None:
+            return self.resume_columns
+        return ["resume_id"] + self.section_columns[section]
+
+    async def _write_table(self, archive: zipfile.ZipFile, sink: _ZipSink, name: str,
+                           resume_filter: Dict[str, Any], section: Optional[str]) -> AsyncIterator[bytes]:
+        cursor = self.db.resumes.find(resume_filter, self._projection(section)).batch_size(self.chunk_size)
+        columns = self._columns(section)
+        header = True
+        with archive.open(f"{name}.csv", mode="w", force_zip64=True) as entry:
+            batch: List[Dict[str, Any]] = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= self.chunk_size:
+                    self._write_chunk(entry, batch, section, columns, header)
+                    header = False
+                    batch = []
+                    yield sink.drain()
+            if batch or header:
+                self._write_chunk(entry, batch, section, columns, header)
+        yield sink.drain()
+
+    def _write_chunk(self, entry, docs: List[Dict[str, Any]], section: Optional[str], columns: List[str], header: bool) -> None:
+        docs = privacy_encryption.decrypt_many(docs)
+        if section is None:
+            # contact.*, personal_details.* etc. become columns
+            frame = pd.json_normalize(docs) if docs else pd.DataFrame()
+            frame = frame.reindex(columns=columns).apply(lambda col: col.map(_cell))
+        else:
+            frame = pd.DataFrame.from_records(self._section_rows(docs, section), columns=columns)
+        buffer = io.StringIO()
+        frame.to_csv(buffer, header=header, index=False)
+        entry.write(buffer.getvalue().encode("utf-8"))
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from bson import Binary
+
+logger = logging.getLogger("uvicorn.error")
+
+JOB_TYPES = ("export", "deletion")
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class GDPRJobQueue:
+    """Mongo-backed queue for GDPR export and deletion jobs
+
+    Jobs live in gdpr_jobs; export artifacts are stored as ordered chunks in
+    gdpr_artifact_chunks. Both expire through TTL indexes on expires_at.
+    """
+
+    def __init__(self, db_client, gdpr_compliance, export_streams: Dict[str, Callable[[Dict[str, Any]], AsyncIterator[bytes]]],
+                 artifact_ttl_hours: int = 24, chunk_size: int = 255 * 1024, poll_seconds: float = 2.0):
+        self.db = db_client
+        self.gdpr = gdpr_compliance
+        # format -> callable(plan) returning the artifact byte stream
+        self.export_streams = export_streams
+        self.artifact_ttl = timedelta(hours=artifact_ttl_hours)
+        self.chunk_size = chunk_size
+        self.poll_seconds = poll_seconds
+        # A running job whose heartbeat is older than this was abandoned by a dead worker
+        self.stale_after_seconds = 120
+        self._wakeup = asyncio.Event()
+
+    async def ensure_indexes(self) -> None:
+        """Create the claim, lookup and TTL indexes"""
+        await self.db.gdpr_jobs.create_index("id", unique=True)
+        await self.db.gdpr_jobs.create_index([("status", 1), ("created_at", 1)])
+        await self.db.gdpr_jobs.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.gdpr_artifact_chunks.create_index([("job_id", 1), ("n", 1)], unique=True)
+        await self.db.gdpr_artifact_chunks.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.gdpr_artifact_chunks.create_index("user_identifier")
+
+    async def submit(self, job_type: str, user_identifier: str, account_id: Optional[str] = None,
+                     export_format: Optional[str] = None, confirmation_token: Optional[str] = None,
+                     reason: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job and return it immediately"""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown GDPR job type: {job_type}")
+        if job_type == "export" and export_format not in self.export_streams:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "status": "queued",
+            "user_identifier": user_identifier,
+            "account_id": account_id,
+            "format": export_format,
+            "confirmation_token": confirmation_token,
+            "reason": reason,
+            "progress": {"bytes_written": 0, "chunks": 0},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "started_at": None,
+            "heartbeat_at": None,
+            "completed_at": None,
+            "expires_at": None,
+        }
+        await self.db.gdpr_jobs.insert_one(job)
+        self._wakeup.set()
+        return await self.get_status(job["id"])
+
+    async def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job without Mongo internals or the confirmation token"""
+        job = await self.db.gdpr_jobs.find_one({"id": job_id}, {"_id": 0, "confirmation_token": 0})
+        if job and job["status"] == "completed" and job.get("expires_at"):
+            expires_at = job["expires_at"].replace(tzinfo=timezone.utc)
+            # The TTL monitor only runs once a minute; report expiry as soon as it happens
+            if expires_at <= datetime.now(timezone.utc):
+                job["status"] = "expired"
+        return job
+
+    async def iter_artifact(self, job_id: str) -> AsyncIterator[bytes]:
+        """Yield a finished export artifact chunk by chunk"""
+        cursor = self.db.gdpr_artifact_chunks.find({"job_id": job_id}, {"_id": 0, "data": 1}).sort("n", 1)
+        async for chunk in cursor:
+            yield bytes(chunk["data"])
+
+    async def watch(self, job_id: str, interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job whenever its status or progress changes, until it finishes"""
+        last = None
+        while True:
+            job = await self.get_status(job_id)
+            if job is None:
+                return
+            snapshot = (job["status"], job["progress"].get("bytes_written"), job["progress"].get("chunks"))
+            if snapshot != last:
+                last = snapshot
+                yield job
+            if job["status"] in TERMINAL_STATUSES + ("expired",):
+                return
+            await asyncio.sleep(interval)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=self.stale_after_seconds)
+        return await self.db.gdpr_jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat_at": {"$lt": stale}},
+            ]},
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}},
+            sort=[("created_at", 1)],
+        )
+
+    async def run_worker(self) -> None:
+        """Claim and process jobs until cancelled; idles on the poll interval"""
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"GDPR job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.process(job)
+
+    async def process(self, job: Dict[str, Any]) -> None:
+        """Run one claimed job and record its outcome"""
+        job_id = job["id"]
+        try:
+            if job["type"] == "export":
+                update = await self._run_export(job)
+            else:
+                update = await self._run_deletion(job)
+            update["status"] = "completed"
+        except asyncio.CancelledError:
+            # Leave the job running; its heartbeat goes stale and another worker picks it up
+            raise
+        except Exception as e:
+            logger.exception(f"GDPR {job['type']} job {job_id} failed: {e}")
+            await self.db.gdpr_artifact_chunks.delete_many({"job_id": job_id})
+            update = {"status": "failed", "error": str(e)}
+
+        now = datetime.now(timezone.utc)
+        update.update({"completed_at": now, "heartbeat_at": now, "expires_at": now + self.artifact_ttl})
+        await self.db.gdpr_jobs.update_one({"id": job_id}, {"$set": update})
+        logger.info(f"GDPR {job['type']} job {job_id} finished: {update['status']}")
+
+    async def _run_export(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = job["id"]
+        # A reclaimed job starts its artifact over
+        await self.db.gdpr_artifact_chunks.delete_many({"job_id": job_id})
+
+        account = None
+        if job.get("account_id"):
+            account = await self.db.users.find_one({"id": job["account_id"]})
+        plan = await self.gdpr.plan_export(job["user_identifier"], account)
+        expires_at = datetime.now(timezone.utc) + self.artifact_ttl
+
+        buffer = bytearray()
+        written = 0
+        chunks = 0
+
+        async def flush() -> None:
+            nonlocal written, chunks
+            await self.db.gdpr_artifact_chunks.insert_one({
+                "job_id": job_id,
+                # Lets a GDPR deletion remove pending artifacts for the same identifier
+                "user_identifier": job["user_identifier"],
+                "n": chunks,
+                "data": Binary(bytes(buffer)),
+                "expires_at": expires_at,
+            })
+            written += len(buffer)
+            chunks += 1
+            buffer.clear()
+            await self.db.gdpr_jobs.update_one(
+                {"id": job_id},
+                {"$set": {"progress": {"bytes_written": written, "chunks": chunks},
+                          "heartbeat_at": datetime.now(timezone.utc)}},
+            )
+
+        async for data in self.export_streams[job["format"]](plan):
+            buffer.extend(data)
+            while len(buffer) >= self.chunk_size:
+                rest = bytes(buffer[self.chunk_size:])
+                del buffer[self.chunk_size:]
+                await flush()
+                buffer.extend(rest)
+        if buffer or chunks == 0:
+            await flush()
+
+        return {"progress": {"bytes_written": written, "chunks": chunks}}
+
+    async def _run_deletion(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        account = None
+        if job.get("account_id"):
+            account = await self.db.users.find_one({"id": job["account_id"]})
+        result = await self.gdpr.delete_user_data(job["user_identifier"], job.get("confirmation_token"), account)
+        return {"result": result}
@@ -1,164 +1,291 @@
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime, timezone
 import json
 
+from pymongo import DeleteMany
+
+from timestamp_utils import to_iso
+
+# Account fields that are never exported
+PRIVATE_USER_FIELDS = {"_id", "hashed_password", "tokens_valid_after"}
+
+DATA_PROCESSING_INFO = {
+    "purposes": [
+        "Resume creation and editing",
+        "ATS scoring and optimization", 
+        "Job description matching",
+        "Locale-specific formatting"
+    ],
+    "legal_basis": "User consent for service provision",
+    "retention_policy": "Data retained until user requests deletion",
+    "encryption_status": "Sensitive fields encrypted at rest"
+}
+
+def _json_default(value: Any) -> str:
+    return to_iso(value) if isinstance(value, datetime) else str(value)
+
 class GDPRCompliance:
     """Handles GDPR compliance features"""
     
-    def __init__(self, db_client):
+    def __init__(self, db_client, use_transactions: bool = False, archive=None, audit=None, consents=None,
+                 photos=None):
         self.db = db_client
+        # PhotoStore; the account's uploaded photos are deleted unless someone else owns them too
+        self.photos = photos
+        # ConsentService; its cached consents are dropped on deletion
+        self.consents = consents
+        # AuditWriter; without one the deletion log is inserted inline
+        self.audit = audit
+        # ResumeArchive; archived resumes are restored before an export reads them
+        self.archive = archive
+        # Transactions need a replica set; without one each collection's delete is atomic on its own
+        self.use_transactions = use_transactions
+    
+    async def ensure_indexes(self) -> None:
+        """Create the indexes used to look up a user's data"""
+        await self.db.resumes.create_index("id")
+        await self.db.resumes.create_index("user_id")
+        await self.db.resumes.create_index("_email_bidx", sparse=True)
+        await self.db.resumes.create_index("user_email", sparse=True)
+        await self.db.users.create_index("id")
+        await self.db.privacy_consents.create_index("user_identifier")
+        await self.db.cleanup_log.create_index("user_id")
+        await self.db.gdpr_deletions.create_index("user_identifier")
     
-    async def export_user_data(self, user_identifier: str) -> Dict[str, Any]:
-        """Export all user data for GDPR compliance"""
+    def _subject_filters(self, user_identifier: str, account: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Indexed filters matching what is stored about a data subject
+        
+        account is the authenticated user matching user_identifier. Only then is the
+        identifier looked up as an email and are the account's resumes included;
+        without it, it only matches an anonymous resume by its ID.
+        """
+        from encryption_utils import privacy_encryption
+        
+        identifiers = [user_identifier]
+        if not account:
+            return {"resume_filter": {"id": user_identifier, "user_id": None}, "identifiers": identifiers}
+        clauses = [
+            {"id": user_identifier},
+            # The contact email is only stored encrypted; key rotation backfills the index on older rows
+            {"_email_bidx": privacy_encryption.blind_index(account["email"])},
+            {"user_id": account["id"]},
+            {"user_email": account["email"]},
+        ]
+        identifiers += [account["id"], account["email"]]
+        return {"resume_filter": {"$or": clauses}, "identifiers": identifiers}
+    
+    async def plan_export(self, user_identifier: str, account: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Resolve what an export covers before any data is streamed
+        
+        account is the authenticated user matching user_identifier; only then are
+        the account record, its consent records and its audit history included, as
+        consents carry IP addresses and user agents.
+        """
         try:
-            # Find all resumes for this user (using email or resume_id as identifier)
-            resumes = []
-            
-            # Search by resume ID first
-            resume = await self.db.resumes.find_one({"id": user_identifier})
-            if resume:
-                resumes.append(resume)
-            else:
-                # Search by email in contact info
-                cursor = self.db.resumes.find({"contact.email": user_identifier})
-                async for resume in cursor:
-                    resumes.append(resume)
+            filters = self._subject_filters(user_identifier, account)
+            resume_filter = filters["resume_filter"]
+            identifiers = filters["identifiers"]
+            if self.archive:
+                await self.archive.restore_matching(resume_filter)
+            audit_sources = []
+            if account:
+                audit_sources = [
+                    ("gdpr_deletions", {"user_identifier": {"$in": identifiers}}),
+                    ("cleanup_log", {"user_id": account["id"]}),
+                ]
             
-            # Prepare export data
-            export_data = {
-                "export_timestamp": datetime.now(timezone.utc).isoformat(),
+            return {
                 "user_identifier": user_identifier,
-                "data_categories": {
-                    "resumes": len(resumes),
-                    "total_records": len(resumes)
-                },
-                "resumes": []
-            }
-            
-            # Add resume data (decrypt sensitive fields for export)
-            from encryption_utils import privacy_encryption
-            
-            for resume in resumes:
-                # Remove MongoDB _id for clean export
-                clean_resume = {k: v for k, v in resume.items() if k != '_id'}
-                
-                # Decrypt sensitive data for user export
-                if resume.get('_encrypted'):
-                    clean_resume = privacy_encryption.decrypt_sensitive_data(clean_resume)
-                
-                export_data["resumes"].append(clean_resume)
-            
-            # Add metadata about data processing
-            export_data["data_processing_info"] = {
-                "purposes": [
-                    "Resume creation and editing",
-                    "ATS scoring and optimization", 
-                    "Job description matching",
-                    "Locale-specific formatting"
-                ],
-                "legal_basis": "User consent for service provision",
-                "retention_policy": "Data retained until user requests deletion",
-                "encryption_status": "Sensitive fields encrypted at rest"
+                "account": account,
+                "resume_filter": resume_filter,
+                "consent_filter": {"user_identifier": {"$in": identifiers}} if account else None,
+                "audit_sources": audit_sources,
             }
-            
-            return export_data
-            
         except Exception as e:
             raise Exception(f"Failed to export user data: {str(e)}")
     
-    async def delete_user_data(self, user_identifier: str, confirmation_token: Optional[str] = None) -> Dict[str, Any]:
-        """Delete all user data for GDPR compliance"""
+    async def stream_export(self, plan: Dict[str, Any], fmt: str = "json", batch_size: int = 50) -> AsyncIterator[bytes]:
+        """Stream an export as JSON or NDJSON; resumes are read and decrypted in small batches"""
+        header = {
+            "export_timestamp": datetime.now(timezone.utc).isoformat(),
+            "user_identifier": plan["user_identifier"],
+        }
+        account = plan["account"]
+        if account:
+            account = {k: v for k, v in account.items() if k not in PRIVATE_USER_FIELDS}
+        counts = {"resumes": 0, "privacy_consents": 0, "audit_records": 0}
+        ndjson = fmt == "ndjson"
+        
+        def encode(value: Any) -> str:
+            return json.dumps(value, default=_json_default, ensure_ascii=False)
+        
+        if ndjson:
+            yield (encode({"type": "export_info", "data": header}) + "\n").encode()
+            if account:
+                yield (encode({"type": "user", "data": account}) + "\n").encode()
+        else:
+            yield ("{" + encode(header)[1:-1] + ',"user":' + encode(account)).encode()
+        
+        sections = [
+            ("privacy_consents", "privacy_consent", self._iter_consents(plan)),
+            ("audit_records", "audit_record", self._iter_audit_records(plan)),
+            ("resumes", "resume", self._iter_resumes(plan, batch_size)),
+        ]
+        for section, record_type, batches in sections:
+            if not ndjson:
+                yield f',"{section}":['.encode()
+            async for batch in batches:
+                chunk = []
+                for record in batch:
+                    if ndjson:
+                        chunk.append(encode({"type": record_type, "data": record}) + "\n")
+                    else:
+                        chunk.append(("," if counts[section] else "") + encode(record))
+                    counts[section] += 1
+                yield "".join(chunk).encode()
+            if not ndjson:
+                yield b"]"
+        
+        counts["total_records"] = sum(counts.values()) + (1 if account else 0)
+        if ndjson:
+            yield (encode({"type": "data_categories", "data": counts}) + "\n").encode()
+            yield (encode({"type": "data_processing_info", "data": DATA_PROCESSING_INFO}) + "\n").encode()
+        else:
+            yield (',"data_categories":' + encode(counts) + ',"data_processing_info":' + encode(DATA_PROCESSING_INFO) + "}").encode()
+    
+    async def _iter_resumes(self, plan: Dict[str, Any], batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        from encryption_utils import privacy_encryption
+        
+        cursor = self.db.resumes.find(plan["resume_filter"], {"_id": 0}).batch_size(batch_size)
+        batch = []
+        async for resume in cursor:
+            batch.append(resume)
+            if len(batch) >= batch_size:
+                yield privacy_encryption.decrypt_many(batch)
+                batch = []
+        if batch:
+            yield privacy_encryption.decrypt_many(batch)
+    
+    async def _iter_consents(self, plan: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        if plan["consent_filter"] is None:
+            return
+        records = await self.db.privacy_consents.find(plan["consent_filter"], {"_id": 0}).to_list(100)
+        yield records
+    
+    async def _iter_audit_records(self, plan: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        for collection, query in plan["audit_sources"]:
+            cursor = self.db[collection].find(query, {"_id": 0}).batch_size(100)
+            batch = []
+            async for record in cursor:
+                batch.append({"source": collection, **record})
+                if len(batch) >= 100:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+    
+    async def delete_user_data(self, user_identifier: str, confirmation_token: Optional[str] = None,
+                               account: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Delete all user data for GDPR compliance
+        
+        Each collection gets one indexed DeleteMany and counts come from the write
+        results. The account itself and its cleanup history are only deleted when
+        account (the authenticated owner of the identifier) is given.
+        """
         try:
-            deletion_log = {
-                "deletion_timestamp": datetime.now(timezone.utc).isoformat(),
-                "user_identifier": user_identifier,
-                "confirmation_token": confirmation_token,
-                "deleted_records": [],
-                "status": "completed"
-            }
+            filters = self._subject_filters(user_identifier, account)
+            identifiers = {"$in": filters["identifiers"]}
+            if self.consents:
+                self.consents.forget(filters["identifiers"])
+            operations = [
+                ("resume", "resumes", filters["resume_filter"]),
+                ("archived_resume", "resumes_archive", filters["resume_filter"]),
+                ("privacy_consent", "privacy_consents", {"user_identifier": identifiers}),
+                ("export_artifact", "gdpr_artifact_chunks", {"user_identifier": identifiers}),
+            ]
+            # Revision history is keyed by resume id only, so it is resolved before the resumes go
+            resume_ids = set(await self.db.resumes.distinct("id", filters["resume_filter"]))
+            resume_ids.update(await self.db.resumes_archive.distinct("id", filters["resume_filter"]))
+            if resume_ids:
+                operations.append(("resume_revision", "resume_revisions", {"resume_id": {"$in": list(resume_ids)}}))
+            if account:
+                operations += [
+                    ("cleanup_log", "cleanup_log", {"user_id": account["id"]}),
+                    ("user", "users", {"id": account["id"]}),
+                ]
             
-            # Find and delete resumes by ID
-            resume = await self.db.resumes.find_one({"id": user_identifier})
-            if resume:
-                result = await self.db.resumes.delete_one({"id": user_identifier})
-                if result.deleted_count > 0:
-                    deletion_log["deleted_records"].append({
-                        "type": "resume",
-                        "id": user_identifier,
-                        "deleted_at": datetime.now(timezone.utc).isoformat()
-                    })
+            released = []
+            if account and self.photos:
+                # Photo blobs live outside Mongo transactions, so they are released up front
+                count = await self.photos.release_owners([account["id"]])
+                released.append({"type": "photo", "count": count, "deleted_at": datetime.now(timezone.utc)})
             
-            # Find and delete resumes by email
-            cursor = self.db.resumes.find({"contact.email": user_identifier})
-            deleted_by_email = []
-            async for resume in cursor:
-                deleted_by_email.append(resume["id"])
-            
-            if deleted_by_email:
-                result = await self.db.resumes.delete_many({"contact.email": user_identifier})
-                for resume_id in deleted_by_email:
-                    deletion_log["deleted_records"].append({
-                        "type": "resume",
-                        "id": resume_id,
-                        "deleted_at": datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Log the deletion for compliance (create clean log without ObjectId)
-            clean_deletion_log = {k: v for k, v in deletion_log.items()}
-            await self.db.gdpr_deletions.insert_one(clean_deletion_log)
+            if self.use_transactions:
+                async with await self.db.client.start_session() as session:
+                    async with session.start_transaction():
+                        deletion_log = await self._apply_deletion(user_identifier, confirmation_token, operations,
+                                                                  released, session)
+            else:
+                deletion_log = await self._apply_deletion(user_identifier, confirmation_token, operations, released)
             
-            deletion_log["total_deleted"] = len(deletion_log["deleted_records"])
+            deletion_log["total_deleted"] = sum(r["count"] for r in deletion_log["deleted_records"])
             return deletion_log
             
         except Exception as e:
             raise Exception(f"Failed to delete user data: {str(e)}")
     
-    async def get_privacy_policy_acceptance(self, user_identifier: str) -> Dict[str, Any]:
-        """Get privacy policy acceptance status"""
-        try:
-            record = await self.db.privacy_consents.find_one({"user_identifier": user_identifier})
-            
-            if not record:
-                return {
-                    "user_identifier": user_identifier,
-                    "has_consent": False,
-                    "consent_date": None,
-                    "consent_version": None
-                }
-            
-            return {
-                "user_identifier": user_identifier,
-                "has_consent": record.get("has_consent", False),
-                "consent_date": record.get("consent_date"),
-                "consent_version": record.get("consent_version", "1.0"),
-                "consent_types": record.get("consent_types", [])
-            }
-            
-        except Exception as e:
-            raise Exception(f"Failed to get privacy consent: {str(e)}")
+    async def _apply_deletion(self, user_identifier: str, confirmation_token: Optional[str],
+                              operations: List[Any], released: List[Dict[str, Any]], session=None) -> Dict[str, Any]:
+        deleted_at = datetime.now(timezone.utc)
+        deleted_records = list(released)
+        for record_type, collection, query in operations:
+            result = await self.db[collection].bulk_write([DeleteMany(query)], ordered=False, session=session)
+            deleted_records.append({"type": record_type, "count": result.deleted_count, "deleted_at": deleted_at})
+        
+        deletion_log = {
+            "deletion_timestamp": deleted_at,
+            "user_identifier": user_identifier,
+            "confirmation_token": confirmation_token,
+            "deleted_records": deleted_records,
+            "status": "completed"
+        }
+        
+        # Log the deletion for compliance (insert a copy so the returned log has no ObjectId)
+        if self.audit:
+            self.audit.record("gdpr_deletions", deletion_log)
+        else:
+            await self.db.gdpr_deletions.insert_one(dict(deletion_log), session=session)
+        return deletion_log
+
+
+def consent_status(user_identifier: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Public consent status for a stored privacy_consents record (or its absence)"""
+    if not record:
+        return {
+            "user_identifier": user_identifier,
+            "has_consent": False,
+            "consent_date": None,
+            "consent_version": None
+        }
     
-    async def record_privacy_consent(self, user_identifier: str, consent_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Record user's privacy policy acceptance"""
-        try:
-            consent_record = {
-                "user_identifier": user_identifier,
-                "has_consent": consent_data.get("has_consent", True),
-                "consent_date": datetime.now(timezone.utc).isoformat(),
-                "consent_version": consent_data.get("version", "1.0"),
-                "consent_types": consent_data.get("consent_types", ["functional", "analytics"]),
-                "ip_address": consent_data.get("ip_address"),
-                "user_agent": consent_data.get("user_agent"),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # Upsert consent record
-            await self.db.privacy_consents.update_one(
-                {"user_identifier": user_identifier},
-                {"$set": consent_record},
-                upsert=True
-            )
-            
-            return consent_record
-            
-        except Exception as e:
-            raise Exception(f"Failed to record privacy consent: {str(e)}")
\ No newline at end of file
+    return {
+        "user_identifier": user_identifier,
+        "has_consent": record.get("has_consent", False),
+        "consent_date": record.get("consent_date"),
+        "consent_version": record.get("consent_version", "1.0"),
+        "consent_types": record.get("consent_types", [])
+    }
+
+
+def build_consent_record(user_identifier: str, consent_data: Dict[str, Any]) -> Dict[str, Any]:
+    """privacy_consents document for a consent submission"""
+    return {
+        "user_identifier": user_identifier,
+        "has_consent": consent_data.get("has_consent", True),
+        "consent_date": datetime.now(timezone.utc),
+        "consent_version": consent_data.get("version", "1.0"),
+        "consent_types": consent_data.get("consent_types", ["functional", "analytics"]),
+        "ip_address": consent_data.get("ip_address"),
+        "user_agent": consent_data.get("user_agent"),
+        "updated_at": datetime.now(timezone.utc)
+    }
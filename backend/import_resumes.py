@@ -0,0 +1,58 @@
+"""Bulk-import resumes from an NDJSON file, one resume per line.
+
+Usage: python import_resumes.py resumes.ndjson --owner-email partner@example.com [--chunk-size 500] [--workers 4]
+
+Uses the server's Mongo and encryption settings (.env). Prints the import report:
+line counts, per-line errors and documents/s.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from import_utils import ResumeImporter, iter_lines
+from photo_utils import owned_photo_ids
+
+
+async def read_chunks(path: str, size: int = 1024 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--owner-email", required=True, help="account the imported resumes belong to")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not server.MONGO_URI:
+        print("Mongo is not configured; set MONGODB_URI", file=sys.stderr)
+        return 1
+    # The server's client belongs to its own event loop; this run gets a fresh one
+    db = AsyncIOMotorClient(server.MONGO_URI)[server.DB_NAME]
+    owner_data = await db.users.find_one({"email": args.owner_email})
+    if owner_data is None:
+        print(f"No account for {args.owner_email}", file=sys.stderr)
+        return 1
+    owner = server.User(**owner_data)
+
+    importer = ResumeImporter(db, server.privacy_encryption, chunk_size=args.chunk_size, workers=args.workers)
+    report = await importer.run(iter_lines(read_chunks(args.path)),
+                                functools.partial(server.prepare_imported_resume, owner=owner,
+                                                  owned_photos=await owned_photo_ids(db, owner.id)))
+    print(json.dumps(report, indent=2))
+    return 0 if report["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
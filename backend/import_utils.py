@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = 1024 * 1024) -> AsyncIterator[Optional[bytes]]:
+    """Split a byte stream into lines; a line longer than max_line_bytes is yielded as None"""
+    buffer = b""
+    overflow = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line, buffer = buffer[:end], buffer[end + 1:]
+            yield None if overflow or len(line) > max_line_bytes else line
+            overflow = False
+        if len(buffer) > max_line_bytes:
+            # Keep counting lines, but not the bytes of one oversized record
+            buffer = b""
+            overflow = True
+    if buffer or overflow:
+        yield None if overflow or len(buffer) > max_line_bytes else buffer
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+class ResumeImporter:
+    """Bulk resume import from NDJSON, one resume per line
+
+    Lines are validated and scored in chunks off the event loop, encrypted across a
+    thread pool and written with unordered insert_many; the next chunk is prepared
+    while the previous one is being inserted. Bad lines are reported, not fatal.
+    """
+
+    def __init__(self, db_client, encryption, chunk_size: int = 500, workers: int = 4, max_errors: int = 1000):
+        self.db = db_client
+        self.encryption = encryption
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_errors = max_errors
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resume-import")
+
+    def _prepare_chunk(self, lines: List[Tuple[int, Optional[bytes]]],
+                       prepare: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Parse, validate and score a chunk; runs in a worker thread"""
+        docs = []
+        errors = []
+        for line_number, line in lines:
+            try:
+                if line is None:
+                    raise ValueError("Line is too long")
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("Line is not a JSON object")
+                docs.append((line_number, prepare(record)))
+            except (ValueError, TypeError) as e:
+                errors.append({"line": line_number, "error": _error_message(e)})
+        return docs, errors
+
+    def _encrypt_slice(self, docs: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(line_number, self.encryption.encrypt_sensitive_data(doc)) for line_number, doc in docs]
+
+    async def _encrypt(self, docs: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        size = -(-len(docs) // self.workers)
+        slices = [docs[i:i + size] for i in range(0, len(docs), size)]
+        encrypted = await asyncio.gather(*(loop.run_in_executor(self._pool, self._encrypt_slice, s) for s in slices))
+        return [item for part in encrypted for item in part]
+
+    async def _insert(self, docs: List[Tuple[int, Dict[str, Any]]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Insert a chunk; returns the number inserted and the lines that failed"""
+        try:
+            result = await self.db.resumes.insert_many([doc for _, doc in docs], ordered=False)
+            return len(result.inserted_ids), []
+        except BulkWriteError as e:
+            errors = [{"line": docs[err["index"]][0], "error": err.get("errmsg", "Write failed")}
+                      for err in e.details.get("writeErrors", [])]
+            return e.details.get("nInserted", len(docs) - len(errors)), errors
+
+    async def run(self, lines: AsyncIterable[Optional[bytes]],
+                  prepare: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Import every non-blank line; prepare turns one parsed record into a resume document or raises ValueError"""
+        started = time.perf_counter()
+        report: Dict[str, Any] = {"lines": 0, "imported": 0, "failed": 0, "errors": []}
+        inserting: Optional[asyncio.Task] = None
+
+        def add_errors(errors: List[Dict[str, Any]]) -> None:
+            report["failed"] += len(errors)
+            room = self.max_errors - len(report["errors"])
+            report["errors"].extend(errors[:max(room, 0)])
+
+        async def finish_insert() -> None:
+            if inserting is not None:
+                inserted, errors = await inserting
+                report["imported"] += inserted
+                add_errors(errors)
+
+        async def process(chunk: List[Tuple[int, Optional[bytes]]]) -> None:
+            nonlocal inserting
+            loop = asyncio.get_running_loop()
+            docs, errors = await loop.run_in_executor(self._pool, self._prepare_chunk, chunk, prepare)
+            add_errors(errors)
+            encrypted = await self._encrypt(docs) if docs else []
+            # One insert in flight: this chunk's insert overlaps the next chunk's preparation
+            await finish_insert()
+            inserting = asyncio.create_task(self._insert(encrypted)) if encrypted else None
+
+        chunk: List[Tuple[int, Optional[bytes]]] = []
+        try:
+            async for line in lines:
+                report["lines"] += 1
+                if line is not None and not line.strip():
+                    continue
+                chunk.append((report["lines"], line))
+                if len(chunk) >= self.chunk_size:
+                    await process(chunk)
+                    chunk = []
+            if chunk:
+                await process(chunk)
+            await finish_insert()
+            inserting = None
+        finally:
+            if inserting is not None and not inserting.done():
+                inserting.cancel()
+
+        seconds = time.perf_counter() - started
+        report["seconds"] = round(seconds, 3)
+        report["docs_per_second"] = round(report["imported"] / seconds, 1) if seconds > 0 else 0.0
+        report["errors"].sort(key=lambda e: e["line"])
+        logger.info(f"Imported {report['imported']} resumes ({report['failed']} failed) "
+                    f"in {report['seconds']}s, {report['docs_per_second']} docs/s")
+        return report
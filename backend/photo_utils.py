@@ -0,0 +1,309 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from PIL import Image, UnidentifiedImageError
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("uvicorn.error")
+
+# Resumes store "photo:<sha256>" in contact.photo_url instead of the image itself
+PHOTO_REF_PREFIX = "photo:"
+PHOTO_SHA_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+DATA_URL_PATTERN = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+
+# Formats accepted for upload (Pillow format name -> media type)
+PHOTO_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def photo_ref(sha256: str) -> str:
+    return f"{PHOTO_REF_PREFIX}{sha256}"
+
+
+def parse_photo_ref(value: Optional[str]) -> Optional[str]:
+    """The SHA-256 of a photo reference, or None for URLs and other values"""
+    if isinstance(value, str) and value.startswith(PHOTO_REF_PREFIX):
+        sha256 = value[len(PHOTO_REF_PREFIX):]
+        if PHOTO_SHA_PATTERN.match(sha256):
+            return sha256
+    return None
+
+
+async def owned_photo_ids(db_client, owner_id: str) -> FrozenSet[str]:
+    """SHA-256 of every photo an account uploaded"""
+    return frozenset([meta["_id"] async for meta in db_client.photos.find({"owners": owner_id}, {"_id": 1})])
+
+
+class LocalBlobs:
+    """Blobs as files under a directory, sharded by the first two hex digits of the name"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def _write(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, name: str, data: bytes, overwrite: bool = False) -> None:
+        await asyncio.to_thread(self._write, name, data)
+
+    async def get(self, name: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, name)
+
+    async def delete(self, name: str) -> None:
+        await asyncio.to_thread(self._remove, name)
+
+
+class GridFSBlobs:
+    """Blobs in a GridFS bucket, looked up by file name
+
+    A blob is first stored with its name as the file id. Overwrites upload a new
+    revision under the same name and only then delete the older ones, so the blob
+    is never missing and a failed upload leaves the previous one in place.
+    """
+
+    def __init__(self, db_client, bucket_name: str = "photos"):
+        self.bucket = AsyncIOMotorGridFSBucket(db_client, bucket_name=bucket_name)
+
+    async def put(self, name: str, data: bytes, overwrite: bool = False) -> None:
+        if overwrite:
+            file_id = await self.bucket.upload_from_stream(name, data)
+            await self._delete_revisions(name, keep=file_id)
+            return
+        try:
+            await self.bucket.upload_from_stream_with_id(name, name, data)
+        except DuplicateKeyError:
+            # A concurrent upload of the same content got there first
+            pass
+
+    async def get(self, name: str) -> Optional[bytes]:
+        try:
+            # The newest revision, i.e. the last completed overwrite
+            stream = await self.bucket.open_download_stream_by_name(name)
+        except NoFile:
+            return None
+        return await stream.read()
+
+    async def delete(self, name: str) -> None:
+        await self._delete_revisions(name)
+
+    async def _delete_revisions(self, name: str, keep: Any = None) -> None:
+        async for revision in self.bucket.find({"filename": name, "_id": {"$ne": keep}}):
+            try:
+                await self.bucket.delete(revision._id)
+            except NoFile:
+                pass
+
+
+class PhotoStore:
+    """Content-addressed photo storage: one encrypted copy per distinct image, plus a thumbnail
+
+    Photos are keyed by the SHA-256 of the uploaded bytes, so the same image uploaded
+    again (or referenced from several resumes) is stored once. Metadata and owners
+    live in the photos collection; a photo is removed once its last owner is gone.
+    """
+
+    def __init__(self, db_client, encryption, backend: str = "gridfs", local_dir: str = "photos",
+                 max_bytes: int = 5 * 1024 * 1024, max_pixels: int = 40_000_000,
+                 thumbnail_size: int = 160, cache_entries: int = 512):
+        if backend == "gridfs":
+            self.blobs = GridFSBlobs(db_client)
+        elif backend == "local":
+            self.blobs = LocalBlobs(local_dir)
+        else:
+            raise ValueError(f"Unknown photo store backend: {backend}")
+        self.db = db_client
+        self.encryption = encryption
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.thumbnail_size = thumbnail_size
+        self.cache_entries = cache_entries
+        # sha256 -> decrypted thumbnail bytes; thumbnails are small and requested on every render
+        self._thumbnails: "OrderedDict[str, bytes]" = OrderedDict()
+
+    async def ensure_indexes(self) -> None:
+        await self.db.photos.create_index("owners")
+
+    @staticmethod
+    def _aad(sha256: str, variant: str) -> bytes:
+        return f"atlascv:photo:{sha256}:{variant}".encode()
+
+    def _process(self, data: bytes) -> Dict[str, Any]:
+        """Validate the image and render its thumbnail; runs in a worker thread"""
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if image.format not in PHOTO_FORMATS:
+                    raise ValueError(f"Unsupported photo format: {image.format}")
+                if image.width * image.height > self.max_pixels:
+                    raise ValueError("Photo dimensions are too large")
+                content_type = PHOTO_FORMATS[image.format]
+                width, height = image.size
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                thumbnail = io.BytesIO()
+                image.save(thumbnail, format="JPEG", quality=80, optimize=True)
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            raise ValueError("Photo is not a valid image")
+        return {
+            "content_type": content_type,
+            "width": width,
+            "height": height,
+            "thumbnail": thumbnail.getvalue(),
+        }
+
+    async def put(self, data: bytes, owner_id: str) -> Dict[str, Any]:
+        """Store a photo for an owner and return its metadata; identical bytes are stored once"""
+        if not data:
+            raise ValueError("Photo is empty")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"Photo exceeds {self.max_bytes // (1024 * 1024)} MB")
+        sha256 = hashlib.sha256(data).hexdigest()
+
+        meta = await self.db.photos.find_one_and_update(
+            {"_id": sha256}, {"$addToSet": {"owners": owner_id}}, return_document=True
+        )
+        if meta is None:
+            processed = await asyncio.to_thread(self._process, data)
+            await self.blobs.put(sha256, self.encryption.seal_bytes(data, self._aad(sha256, "original")))
+            await self.blobs.put(f"{sha256}.thumb", self.encryption.seal_bytes(
+                processed["thumbnail"], self._aad(sha256, "thumbnail")))
+            # Blobs are written before the metadata, so a listed photo is always readable
+            fields = {
+                "content_type": processed["content_type"],
+                "size": len(data),
+                "width": processed["width"],
+                "height": processed["height"],
+                "_key_id": self.encryption.active_key_id,
+                "created_at": datetime.now(timezone.utc),
+            }
+            try:
+                await self.db.photos.update_one(
+                    {"_id": sha256}, {"$setOnInsert": fields, "$addToSet": {"owners": owner_id}}, upsert=True
+                )
+            except DuplicateKeyError:
+                await self.db.photos.update_one({"_id": sha256}, {"$addToSet": {"owners": owner_id}})
+            meta = {"_id": sha256, **fields}
+        return self._describe(meta)
+
+    @staticmethod
+    def _describe(meta: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ref": photo_ref(meta["_id"]),
+            "sha256": meta["_id"],
+            "content_type": meta["content_type"],
+            "size": meta["size"],
+            "width": meta["width"],
+            "height": meta["height"],
+        }
+
+    async def store_inline(self, value: Optional[str], owner_id: str) -> Optional[str]:
+        """Replace an inline base64 data URL with a stored photo reference; other values pass through"""
+        if not isinstance(value, str) or not DATA_URL_PATTERN.match(value):
+            return value
+        try:
+            data = base64.b64decode(value[value.index(",") + 1:], validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Photo is not valid base64")
+        return (await self.put(data, owner_id))["ref"]
+
+    async def owns(self, sha256: str, owner_id: Optional[str]) -> bool:
+        """Whether an account uploaded this photo; only its owners may read it or reference it"""
+        if not owner_id:
+            return False
+        return await self.db.photos.find_one({"_id": sha256, "owners": owner_id}, {"_id": 1}) is not None
+
+    async def get(self, sha256: str, thumbnail: bool = False) -> Optional[Tuple[bytes, str]]:
+        """Decrypted photo (or thumbnail) bytes and media type, or None if unknown"""
+        if thumbnail:
+            cached = self._thumbnails.get(sha256)
+            if cached is not None:
+                self._thumbnails.move_to_end(sha256)
+                return cached, "image/jpeg"
+        meta = await self.db.photos.find_one({"_id": sha256}, {"content_type": 1})
+        if not meta:
+            return None
+        variant = "thumbnail" if thumbnail else "original"
+        blob = await self.blobs.get(f"{sha256}.thumb" if thumbnail else sha256)
+        if blob is None:
+            logger.error(f"Photo {sha256} is listed but its {variant} blob is missing")
+            return None
+        data = self.encryption.open_bytes(blob, self._aad(sha256, variant))
+        if not thumbnail:
+            return data, meta["content_type"]
+        self._thumbnails[sha256] = data
+        while len(self._thumbnails) > self.cache_entries:
+            self._thumbnails.popitem(last=False)
+        return data, "image/jpeg"
+
+    async def count_pending(self, target_key_id: str) -> int:
+        """Photos still sealed under another key"""
+        return await self.db.photos.count_documents({"_key_id": {"$ne": target_key_id}})
+
+    async def reseal(self, target_key_id: str) -> int:
+        """Re-encrypt photos sealed under other keys with the active key (key rotation)"""
+        resealed = 0
+        async for meta in self.db.photos.find({"_key_id": {"$ne": target_key_id}}, {"_id": 1, "_key_id": 1}):
+            sha256 = meta["_id"]
+            for name, variant in ((sha256, "original"), (f"{sha256}.thumb", "thumbnail")):
+                blob = await self.blobs.get(name)
+                if blob is not None:
+                    data = self.encryption.open_bytes(blob, self._aad(sha256, variant))
+                    await self.blobs.put(name, self.encryption.seal_bytes(data, self._aad(sha256, variant)),
+                                         overwrite=True)
+            await self.db.photos.update_one(
+                {"_id": sha256, "_key_id": meta.get("_key_id")}, {"$set": {"_key_id": target_key_id}}
+            )
+            resealed += 1
+        return resealed
+
+    async def release_owners(self, owner_ids: Iterable[str]) -> int:
+        """Drop owners from their photos and delete photos nobody owns any more"""
+        owner_ids = list(owner_ids)
+        if not owner_ids:
+            return 0
+        await self.db.photos.update_many(
+            {"owners": {"$in": owner_ids}}, {"$pull": {"owners": {"$in": owner_ids}}}
+        )
+        deleted = 0
+        async for meta in self.db.photos.find({"owners": {"$size": 0}}, {"_id": 1}):
+            sha256 = meta["_id"]
+            # Someone may have uploaded the same image meanwhile
+            result = await self.db.photos.delete_one({"_id": sha256, "owners": {"$size": 0}})
+            if result.deleted_count:
+                await self.blobs.delete(sha256)
+                await self.blobs.delete(f"{sha256}.thumb")
+                self._thumbnails.pop(sha256, None)
+                deleted += 1
+        return deleted
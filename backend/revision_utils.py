@@ -0,0 +1,291 @@
+import asyncio
+import copy
+import json
+import logging
+import zlib
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Binary
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from cleanup_utils import LeaseLock
+
+logger = logging.getLogger("uvicorn.error")
+
+
+# -----------------------
+# JSON Patch (RFC 6902: add, remove, replace)
+# -----------------------
+def _pointer(path: str, key: Any) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def _steps(pointer: str) -> List[str]:
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer.split("/")[1:]]
+
+
+def json_diff(before: Any, after: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Operations turning before into after; list items are compared by position"""
+    if isinstance(before, dict) and isinstance(after, dict):
+        ops = [{"op": "remove", "path": _pointer(path, key)} for key in before if key not in after]
+        for key, value in after.items():
+            if key not in before:
+                ops.append({"op": "add", "path": _pointer(path, key), "value": value})
+            elif before[key] != value:
+                ops.extend(json_diff(before[key], value, _pointer(path, key)))
+        return ops
+    if isinstance(before, list) and isinstance(after, list):
+        common = min(len(before), len(after))
+        ops = []
+        for i in range(common):
+            if before[i] != after[i]:
+                ops.extend(json_diff(before[i], after[i], _pointer(path, i)))
+        # Remove from the end so earlier indexes stay valid
+        ops.extend({"op": "remove", "path": _pointer(path, i)} for i in range(len(before) - 1, common - 1, -1))
+        ops.extend({"op": "add", "path": _pointer(path, "-"), "value": after[i]} for i in range(common, len(after)))
+        return ops
+    return [] if before == after else [{"op": "replace", "path": path, "value": after}]
+
+
+def json_apply(document: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Apply operations produced by json_diff (or section-level adds) to a copy of document"""
+    document = copy.deepcopy(document)
+    for op in ops:
+        steps = _steps(op["path"])
+        if not steps:
+            document = copy.deepcopy(op["value"])
+            continue
+        parent = document
+        for step in steps[:-1]:
+            parent = parent[int(step)] if isinstance(parent, list) else parent[step]
+        last = steps[-1]
+        if isinstance(parent, list):
+            if op["op"] == "remove":
+                del parent[int(last)]
+            elif last == "-":
+                parent.append(copy.deepcopy(op["value"]))
+            elif op["op"] == "add":
+                parent.insert(int(last), copy.deepcopy(op["value"]))
+            else:
+                parent[int(last)] = copy.deepcopy(op["value"])
+        elif op["op"] == "remove":
+            parent.pop(last, None)
+        else:
+            parent[last] = copy.deepcopy(op["value"])
+    return document
+
+
+class RevisionStore:
+    """Resume history as periodic full snapshots plus JSON Patch deltas between them
+
+    Each revision is zlib-compressed and sealed with the resume encryption keys.
+    A version is rebuilt by applying the deltas after the nearest earlier snapshot.
+    Compaction thins old history to one revision per day, drops revisions past the
+    retention period and caps the count per resume, re-encoding what is kept.
+    """
+
+    def __init__(self, db_client, encryption, snapshot_every: int = 20, retention_days: int = 180,
+                 compact_after_days: int = 7, max_revisions: int = 200, batch_size: int = 100):
+        self.db = db_client
+        self.encryption = encryption
+        self.snapshot_every = snapshot_every
+        self.retention = timedelta(days=retention_days)
+        self.compact_after = timedelta(days=compact_after_days)
+        self.max_revisions = max_revisions
+        self.batch_size = batch_size
+        self.lock = LeaseLock(db_client, "revision_compaction")
+
+    async def ensure_indexes(self) -> None:
+        await self.db.resume_revisions.create_index([("resume_id", 1), ("version", 1)], unique=True)
+        await self.db.resume_revisions.create_index([("compacted", 1), ("created_at", 1)])
+
+    def _aad(self, resume_id: str, version: int) -> bytes:
+        return f"atlascv:revision:{resume_id}:{version}".encode()
+
+    def _pack(self, resume_id: str, version: int, kind: str, payload: Any, chain: int,
+              created_at: datetime) -> Dict[str, Any]:
+        data = zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode(), 6)
+        return {
+            "resume_id": resume_id,
+            "version": version,
+            "kind": kind,
+            # Deltas since the last snapshot, including this one
+            "chain": chain,
+            "data": Binary(self.encryption.seal_bytes(data, self._aad(resume_id, version))),
+            "_key_id": self.encryption.active_key_id,
+            "created_at": created_at,
+        }
+
+    def _unpack(self, revision: Dict[str, Any]) -> Any:
+        data = self.encryption.open_bytes(revision["data"], self._aad(revision["resume_id"], revision["version"]))
+        return json.loads(zlib.decompress(data))
+
+    async def record(self, resume_id: str, version: int, content: Optional[Dict[str, Any]] = None,
+                     before: Optional[Dict[str, Any]] = None, ops: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """Record the content of a resume version
+
+        Give the full content (and the previous content, if known) or just the
+        delta ops. Returns False when a delta cannot be stored because the resume
+        has no history yet; the caller then records the full content instead.
+        """
+        last = await self.db.resume_revisions.find_one(
+            {"resume_id": resume_id}, {"version": 1, "chain": 1}, sort=[("version", -1)]
+        )
+        if last is not None and last["version"] >= version:
+            return True
+        if ops is None and before is not None and content is not None:
+            ops = json_diff(before, content)
+        now = datetime.now(timezone.utc)
+        if content is not None and (last is None or ops is None or last["chain"] + 1 >= self.snapshot_every):
+            revision = self._pack(resume_id, version, "snapshot", content, 0, now)
+        elif last is None or ops is None:
+            return False
+        else:
+            revision = self._pack(resume_id, version, "delta", ops, last["chain"] + 1, now)
+        try:
+            await self.db.resume_revisions.insert_one(revision)
+        except DuplicateKeyError:
+            # Recorded concurrently for the same version
+            pass
+        return True
+
+    async def list(self, resume_id: str) -> List[Dict[str, Any]]:
+        """Recorded versions of a resume, newest first"""
+        cursor = self.db.resume_revisions.find(
+            {"resume_id": resume_id}, {"_id": 0, "version": 1, "kind": 1, "created_at": 1}
+        ).sort("version", -1)
+        return await cursor.to_list(None)
+
+    async def reconstruct(self, resume_id: str, version: int) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Content of a recorded version and its revision entry, or None if it isn't recorded"""
+        snapshot = await self.db.resume_revisions.find_one(
+            {"resume_id": resume_id, "version": {"$lte": version}, "kind": "snapshot"}, sort=[("version", -1)]
+        )
+        if snapshot is None:
+            return None
+        content = self._unpack(snapshot)
+        target = snapshot
+        async for delta in self.db.resume_revisions.find(
+            {"resume_id": resume_id, "version": {"$gt": snapshot["version"], "$lte": version}}
+        ).sort("version", 1):
+            content = json_apply(content, self._unpack(delta))
+            target = delta
+        if target["version"] != version:
+            return None
+        return content, target
+
+    async def _history(self, resume_id: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Every revision of a resume with its reconstructed content, oldest first"""
+        history = []
+        content: Any = None
+        async for revision in self.db.resume_revisions.find({"resume_id": resume_id}).sort("version", 1):
+            payload = self._unpack(revision)
+            if revision["kind"] == "snapshot":
+                content = payload
+            elif content is None:
+                # Deltas whose snapshot was lost cannot be rebuilt
+                continue
+            else:
+                content = json_apply(content, payload)
+            history.append((revision, content))
+        return history
+
+    def _keep(self, history: List[Tuple[Dict[str, Any], Dict[str, Any]]], now: datetime) -> List[int]:
+        """Indexes of the revisions the policy keeps"""
+        keep = []
+        for i, (revision, _) in enumerate(history):
+            created_at = revision["created_at"].replace(tzinfo=timezone.utc)
+            if i == len(history) - 1 or created_at >= now - self.compact_after:
+                keep.append(i)
+            elif created_at >= now - self.retention:
+                # One revision per day for older history: the last one of the day
+                next_created = history[i + 1][0]["created_at"].replace(tzinfo=timezone.utc)
+                if next_created.date() != created_at.date():
+                    keep.append(i)
+        return keep[-self.max_revisions:]
+
+    async def compact(self, resume_id: str) -> int:
+        """Apply the retention policy to one resume's history; returns the number of revisions dropped"""
+        history = await self._history(resume_id)
+        if not history:
+            return 0
+        now = datetime.now(timezone.utc)
+        keep = self._keep(history, now)
+        kept_ids = {history[i][0]["_id"] for i in keep}
+
+        operations: List[Any] = []
+        previous: Any = None
+        chain = 0
+        for position, i in enumerate(keep):
+            revision, content = history[i]
+            if position == 0 or chain + 1 >= self.snapshot_every:
+                packed = self._pack(resume_id, revision["version"], "snapshot", content, 0, revision["created_at"])
+                chain = 0
+            else:
+                chain += 1
+                packed = self._pack(resume_id, revision["version"], "delta", json_diff(previous, content),
+                                    chain, revision["created_at"])
+            previous = content
+            packed["compacted"] = revision["created_at"].replace(tzinfo=timezone.utc) < now - self.compact_after
+            operations.append(ReplaceOne({"_id": revision["_id"]}, packed))
+        # Only what the history above covered: a revision saved meanwhile has a higher version and stays
+        latest = history[-1][0]["version"]
+        dropped = [DeleteOne({"_id": revision["_id"]}) for revision in
+                   await self.db.resume_revisions.find({"resume_id": resume_id, "version": {"$lte": latest}},
+                                                       {"_id": 1}).to_list(None)
+                   if revision["_id"] not in kept_ids]
+        # Replacements first: a reader between the two steps still finds a snapshot
+        await self.db.resume_revisions.bulk_write(operations, ordered=True)
+        if dropped:
+            await self.db.resume_revisions.bulk_write(dropped, ordered=False)
+        return len(dropped)
+
+    async def compact_all(self) -> Optional[int]:
+        """Compact every resume with uncompacted old revisions; None if another worker is on it"""
+        if not await self.lock.acquire():
+            return None
+        try:
+            cutoff = datetime.now(timezone.utc) - self.compact_after
+            resume_ids = await self.db.resume_revisions.distinct(
+                "resume_id", {"compacted": {"$ne": True}, "created_at": {"$lt": cutoff}}
+            )
+            dropped = 0
+            for i, resume_id in enumerate(resume_ids):
+                dropped += await self.compact(resume_id)
+                if (i + 1) % self.batch_size == 0:
+                    await self.lock.acquire()
+            if resume_ids:
+                logger.info(f"Compacted history of {len(resume_ids)} resumes, dropping {dropped} revisions")
+            return dropped
+        finally:
+            await self.lock.release()
+
+    async def count_pending(self, target_key_id: str) -> int:
+        """Revisions still sealed under another key"""
+        return await self.db.resume_revisions.count_documents({"_key_id": {"$ne": target_key_id}})
+
+    async def reseal(self, target_key_id: str) -> int:
+        """Re-encrypt revisions sealed under other keys with the active key (key rotation)"""
+        resealed = 0
+        async for revision in self.db.resume_revisions.find({"_key_id": {"$ne": target_key_id}}):
+            aad = self._aad(revision["resume_id"], revision["version"])
+            data = self.encryption.seal_bytes(self.encryption.open_bytes(revision["data"], aad), aad)
+            result = await self.db.resume_revisions.update_one(
+                {"_id": revision["_id"], "_key_id": revision.get("_key_id")},
+                {"$set": {"data": Binary(data), "_key_id": target_key_id}},
+            )
+            resealed += result.modified_count
+        return resealed
+
+    async def run_schedule(self, interval_seconds: float) -> None:
+        """Compact revision history every interval"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.compact_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Revision compaction failed: {str(e)}")
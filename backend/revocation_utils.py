@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import datetime, timezone, timedelta
+from typing import Iterator, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter used as a fast negative check for revoked tokens"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        # Standard sizing: m = -n ln(p) / (ln 2)^2, k = m/n ln 2
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Kirsch-Mitzenmacher double hashing over a single blake2b digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TokenRevocation:
+    """Tracks revoked JWTs in MongoDB, with an in-memory Bloom filter in front of it"""
+
+    def __init__(
+        self,
+        db_client,
+        refresh_seconds: int = 30,
+        rebuild_seconds: int = 600,
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+    ):
+        self.db = db_client
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_at: Optional[datetime] = None
+        self._rebuilt_at: Optional[datetime] = None
+        # Revocations written by other workers may carry a slightly skewed clock
+        self._sync_overlap = timedelta(seconds=5)
+
+    async def ensure_indexes(self) -> None:
+        """Create the lookup and TTL indexes for the revocation list"""
+        await self.db.revoked_tokens.create_index("jti", unique=True)
+        await self.db.revoked_tokens.create_index("revoked_at")
+        # Entries are useless once the token itself has expired
+        await self.db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+
+    async def revoke(self, jti: str, user_id: Optional[str], expires_at: datetime, reason: str = "logout") -> None:
+        """Add a token to the revocation list"""
+        now = datetime.now(timezone.utc)
+        await self.db.revoked_tokens.update_one(
+            {"jti": jti},
+            {"$setOnInsert": {
+                "jti": jti,
+                "user_id": user_id,
+                "reason": reason,
+                "revoked_at": now,
+                "expires_at": expires_at,
+            }},
+            upsert=True,
+        )
+        self._bloom.add(jti)
+
+    async def is_revoked(self, jti: str, issued_at: Optional[float] = None) -> bool:
+        """Check a token id; only Bloom filter hits cost a database round trip
+
+        A miss is only final for tokens issued before the last sync. A younger token
+        may have been revoked on another worker since, so the collection is checked
+        for it. Older tokens revoked elsewhere still pass until the next sync, at
+        most refresh_seconds plus the sync overlap later.
+        """
+        if jti not in self._bloom and not self._issued_since_sync(issued_at):
+            return False
+        record = await self.db.revoked_tokens.find_one({"jti": jti}, {"_id": 1})
+        return record is not None
+
+    def _issued_since_sync(self, issued_at: Optional[float]) -> bool:
+        if issued_at is None:
+            return False
+        if self._synced_at is None:
+            return True
+        return issued_at >= (self._synced_at - self._sync_overlap).timestamp()
+
+    async def sync(self) -> int:
+        """Add revocations recorded since the last sync (e.g. by other workers)"""
+        if self._synced_at is None:
+            return await self.rebuild()
+        started = datetime.now(timezone.utc)
+        cursor = self.db.revoked_tokens.find(
+            {"revoked_at": {"$gte": self._synced_at - self._sync_overlap}},
+            {"jti": 1, "_id": 0},
+        )
+        added = 0
+        async for record in cursor:
+            self._bloom.add(record["jti"])
+            added += 1
+        self._synced_at = started
+        return added
+
+    async def rebuild(self) -> int:
+        """Rebuild the Bloom filter from all unexpired revocations"""
+        started = datetime.now(timezone.utc)
+        query = {"expires_at": {"$gt": started}}
+        live = await self.db.revoked_tokens.count_documents(query)
+        # Leave headroom so the false-positive rate holds until the next rebuild
+        bloom = BloomFilter(max(self.capacity, live * 2), self.error_rate)
+        async for record in self.db.revoked_tokens.find(query, {"jti": 1, "_id": 0}):
+            bloom.add(record["jti"])
+        self._bloom = bloom
+        self._synced_at = started
+        self._rebuilt_at = started
+        # Pick up anything revoked while the new filter was being built
+        await self.sync()
+        return live
+
+    async def run_refresh_loop(self) -> None:
+        """Periodically sync the filter and rebuild it to drop expired entries"""
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                due = self._rebuilt_at is None or (
+                    datetime.now(timezone.utc) - self._rebuilt_at
+                ).total_seconds() >= self.rebuild_seconds
+                if due or self._bloom.count > self._bloom.capacity:
+                    await self.rebuild()
+                else:
+                    await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Revocation filter refresh failed: {e}")
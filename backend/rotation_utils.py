@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+from encryption_utils import ENCRYPTION_MARKERS
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class KeyRotationJob:
+    """Re-encrypts stored resumes under the active key, in throttled, checkpointed batches"""
+
+    def __init__(self, db_client, encryption, batch_size: int = 200, max_docs_per_second: float = 500.0,
+                 sealed_stores=()):
+        self.db = db_client
+        self.encryption = encryption
+        # Stores of sealed blobs (photos, revisions), re-sealed after the resumes via reseal()/count_pending()
+        self.sealed_stores = sealed_stores
+        self.batch_size = batch_size
+        self.max_docs_per_second = max_docs_per_second
+        # A job whose heartbeat is older than this is considered abandoned and can be resumed
+        self.stale_after_seconds = 120
+
+    def _pending_query(self, target_key_id: str) -> Dict[str, Any]:
+        # Matches legacy documents without a key id as well as plaintext ones
+        return {"_key_id": {"$ne": target_key_id}}
+
+    async def start(self) -> Dict[str, Any]:
+        """Create a rotation job for the active key, or resume an unfinished one"""
+        target = self.encryption.active_key_id
+        now = datetime.now(timezone.utc)
+        job = await self.db.key_rotation_jobs.find_one(
+            {"target_key_id": target, "status": {"$in": ["running", "failed"]}},
+            sort=[("started_at", -1)],
+        )
+        if job and job["status"] == "running":
+            idle = (now - job["heartbeat_at"].replace(tzinfo=timezone.utc)).total_seconds()
+            if idle < self.stale_after_seconds:
+                raise RuntimeError("A key rotation job is already running")
+
+        if job is None:
+            job = {
+                "id": str(uuid.uuid4()),
+                "target_key_id": target,
+                "status": "running",
+                "processed": 0,
+                "rewritten": 0,
+                "failed": 0,
+                "checkpoint": None,
+                "started_at": now,
+                "heartbeat_at": now,
+                "completed_at": None,
+                "retirable_key_ids": [],
+            }
+            await self.db.key_rotation_jobs.insert_one(job)
+        else:
+            await self.db.key_rotation_jobs.update_one(
+                {"id": job["id"]}, {"$set": {"status": "running", "heartbeat_at": now}}
+            )
+        return job
+
+    async def run(self, job_id: str) -> Dict[str, Any]:
+        """Process a job to completion, resuming from its checkpoint"""
+        job = await self.db.key_rotation_jobs.find_one({"id": job_id})
+        target = job["target_key_id"]
+        checkpoint = job.get("checkpoint")
+        encrypted_fields = self.encryption.field_engine.sections + ENCRYPTION_MARKERS
+        try:
+            while True:
+                started = time.monotonic()
+                query = self._pending_query(target)
+                if checkpoint is not None:
+                    query = {**query, "_id": {"$gt": checkpoint}}
+                batch = await self.db.resumes.find(query).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+
+                operations = []
+                failed = 0
+                for doc in batch:
+                    try:
+                        reencrypted = self.encryption.encrypt_sensitive_data(
+                            self.encryption.decrypt_sensitive_data(doc, strict=True)
+                        )
+                    except Exception as e:
+                        failed += 1
+                        logger.warning(f"Key rotation skipped resume {doc.get('id')}: {e}")
+                        continue
+                    # Skip documents that changed since they were read; that write used the active key
+                    operations.append(UpdateOne(
+                        {"_id": doc["_id"], "updated_at": doc.get("updated_at")},
+                        {"$set": {k: reencrypted[k] for k in encrypted_fields if k in reencrypted}},
+                    ))
+
+                rewritten = 0
+                if operations:
+                    result = await self.db.resumes.bulk_write(operations, ordered=False)
+                    rewritten = result.modified_count
+
+                checkpoint = batch[-1]["_id"]
+                await self.db.key_rotation_jobs.update_one(
+                    {"id": job_id},
+                    {
+                        "$set": {"checkpoint": checkpoint, "heartbeat_at": datetime.now(timezone.utc)},
+                        "$inc": {"processed": len(batch), "rewritten": rewritten, "failed": failed},
+                    },
+                )
+
+                # Throttle to keep the job from competing with user traffic
+                min_duration = len(batch) / self.max_docs_per_second
+                await asyncio.sleep(max(0.0, min_duration - (time.monotonic() - started)))
+
+            for store in self.sealed_stores:
+                resealed = await store.reseal(target)
+                logger.info(f"Key rotation job {job_id} re-sealed {resealed} {type(store).__name__} entries")
+            return await self._finish(job_id, target)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Key rotation job {job_id} failed: {e}")
+            await self.db.key_rotation_jobs.update_one(
+                {"id": job_id}, {"$set": {"status": "failed", "error": str(e)}}
+            )
+            raise
+
+    async def _finish(self, job_id: str, target: str) -> Dict[str, Any]:
+        remaining = await self.db.resumes.count_documents(self._pending_query(target))
+        # Archived resumes are re-encrypted when restored; until then their keys must stay
+        archived = await self.db.resumes_archive.count_documents(self._pending_query(target))
+        # Sealed blobs that failed to re-seal still need their old key
+        sealed = 0
+        for store in self.sealed_stores:
+            sealed += await store.count_pending(target)
+        update: Dict[str, Any] = {"remaining": remaining, "heartbeat_at": datetime.now(timezone.utc)}
+        if remaining == 0:
+            # Nothing references the other keys any more; they can be removed from the keyring
+            update.update({
+                "status": "completed",
+                "completed_at": datetime.now(timezone.utc),
+                "retirable_key_ids": [] if archived or sealed else [k for k in self.encryption.keys if k != target],
+                "archived_pending": archived,
+                "sealed_pending": sealed,
+            })
+        else:
+            # Rows skipped by concurrent edits or failures; a rerun starts over from the beginning
+            update.update({"status": "failed", "checkpoint": None, "error": f"{remaining} resumes still pending"})
+        await self.db.key_rotation_jobs.update_one({"id": job_id}, {"$set": update})
+        logger.info(f"Key rotation job {job_id} finished: {update['status']} ({remaining} remaining)")
+        return await self.get_status(job_id)
+
+    async def get_status(self, job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a job (or the most recent one) without Mongo internals"""
+        query = {"id": job_id} if job_id else {}
+        job = await self.db.key_rotation_jobs.find_one(query, {"_id": 0, "checkpoint": 0}, sort=[("started_at", -1)])
+        return job
@@ -0,0 +1,209 @@
+import copy
+import functools
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, BeforeValidator, TypeAdapter, ValidationError
+from pydantic_core import PydanticUndefined
+
+from timestamp_utils import to_iso
+
+_MISSING = object()
+
+# Schemas of bodies parsed by json_body (and their nested models), added to the OpenAPI components
+BODY_SCHEMAS: Dict[str, Any] = {}
+
+
+def _model_type(annotation: Any) -> Optional[Type[BaseModel]]:
+    return annotation if isinstance(annotation, type) and issubclass(annotation, BaseModel) else None
+
+
+def _is_timestamp(annotation: Any, metadata: List[Any]) -> bool:
+    if any(isinstance(m, BeforeValidator) and m.func is to_iso for m in metadata):
+        return True
+    # Optional[Timestamp] keeps the validator inside the Union's Annotated member
+    return any(typing.get_origin(arg) is typing.Annotated and _is_timestamp(None, list(arg.__metadata__))
+               for arg in typing.get_args(annotation))
+
+
+def _converter(annotation: Any, metadata: List[Any]) -> Optional[Callable[[Any], Any]]:
+    """How a stored value of this annotation is shaped; None when it is returned as is"""
+    if _is_timestamp(annotation, metadata):
+        return to_iso
+    origin = typing.get_origin(annotation)
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if origin is typing.Union and len(args) == 1:
+        inner = _converter(args[0], [])
+        return None if inner is None else (lambda value: None if value is None else inner(value))
+    model = _model_type(annotation)
+    if model is not None:
+        return lambda value: shape(model, value)
+    if origin is list and args and _model_type(args[0]) is not None:
+        item = args[0]
+        return lambda value: [shape(item, v) for v in value]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _plan(model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Optional[Callable[[], Any]], Optional[Callable[[Any], Any]]], ...]:
+    """Per field: name, default, default factory and converter; built once per model"""
+    plan = []
+    for name, field in model.model_fields.items():
+        default = field.default
+        if isinstance(default, BaseModel):
+            default = default.model_dump()
+        plan.append((name, default, field.default_factory, _converter(field.annotation, field.metadata)))
+    return tuple(plan)
+
+
+def shape(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """What model(**data).model_dump() gives for a trusted stored document, without validating it
+
+    Unknown keys are dropped, missing fields get their defaults and timestamps become
+    ISO strings; values are not type-checked, so only use this on documents the API wrote.
+    """
+    out = {}
+    for name, default, factory, convert in _plan(model):
+        value = data.get(name, _MISSING)
+        if value is _MISSING:
+            value = factory() if factory is not None else copy.deepcopy(default)
+        elif convert is not None:
+            value = convert(value)
+        out[name] = value
+    return out
+
+
+def _compactor(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """How a value of this annotation is compacted; None when it is sent as is"""
+    origin = typing.get_origin(annotation)
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if origin is typing.Union and len(args) == 1:
+        inner = _compactor(args[0])
+        return None if inner is None else (lambda value: None if value is None else inner(value))
+    model = _model_type(annotation)
+    if model is not None:
+        return lambda value: compact_dump(model, value)
+    if origin is list and args and _model_type(args[0]) is not None:
+        item = args[0]
+        return lambda value: [compact_dump(item, v) for v in value]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _compact_plan(model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Optional[Callable[[Any], Any]]], ...]:
+    """Per field: name, the default it may be left out at (_MISSING for factories) and compactor"""
+    plan = []
+    for name, (_, default, factory, _) in zip(model.model_fields, _plan(model)):
+        # Factory defaults (ids, timestamps) differ per object and aren't in the schema; always send them
+        omit_at = _MISSING if factory is not None or default is PydanticUndefined else default
+        plan.append((name, omit_at, _compactor(model.model_fields[name].annotation)))
+    return tuple(plan)
+
+
+def compact_dump(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """A shaped or dumped model without the fields still at their schema default, at any depth
+
+    Empty lists, empty strings and None are left out wherever they are the default, so
+    filling the missing fields from the JSON schema defaults rebuilds the full object.
+    """
+    out = {}
+    for name, omit_at, compactor in _compact_plan(model):
+        value = data.get(name, _MISSING)
+        if value is _MISSING or value == omit_at:
+            continue
+        out[name] = compactor(value) if compactor is not None else value
+    return out
+
+
+def changed_fields(model: Type[BaseModel], before: Dict[str, Any], after: Dict[str, Any],
+                   keep: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """The top-level fields of after that differ from before (plus keep), each compacted within itself
+
+    A changed field is sent even when it went back to its default, so the client can
+    tell "cleared" from "unchanged"; it replaces the whole field, not merges into it.
+    """
+    out = {}
+    for name, _, compactor in _compact_plan(model):
+        value = after.get(name, _MISSING)
+        if value is _MISSING or (name not in keep and before.get(name, _MISSING) == value):
+            continue
+        out[name] = compactor(value) if compactor is not None else value
+    return out
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Return pre-shaped content as is; FastAPI skips response_model validation for Response objects"""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def raw_json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Response for an already encoded JSON body, e.g. one kept in a cache"""
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Whether an If-None-Match (weak) or If-Match (strong) header names etag
+
+    Handles lists of tags and "*"; weak W/ tags only match in weak comparison.
+    """
+    if header is None:
+        return False
+    for tag in (t.strip() for t in header.split(",")):
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def type_adapter(model: Any) -> TypeAdapter:
+    """One TypeAdapter per type; building the validator is the expensive part"""
+    return TypeAdapter(model)
+
+
+def json_body(model: Type[BaseModel]) -> Callable[[Request], Any]:
+    """Dependency validating the request body straight from its JSON bytes
+
+    Skips FastAPI's json.loads() into dicts followed by validation of those dicts;
+    errors are reported in FastAPI's usual 422 format.
+    """
+    adapter = type_adapter(model)
+
+    async def parse(request: Request) -> Any:
+        try:
+            return adapter.validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])}
+                                          for error in e.errors(include_url=False)])
+
+    return parse
+
+
+def json_body_openapi(model: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra documenting a json_body() request body"""
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    BODY_SCHEMAS.update(schema.pop("$defs", {}))
+    BODY_SCHEMAS[model.__name__] = schema
+    return {"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"$ref": f"#/components/schemas/{model.__name__}"}}}}}
+
+
+def install_body_schemas(app: FastAPI) -> None:
+    """Add the json_body() schemas to the app's generated OpenAPI document"""
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is None:
+            schema = FastAPI.openapi(app)
+            components = schema.setdefault("components", {}).setdefault("schemas", {})
+            for name, body_schema in BODY_SCHEMAS.items():
+                components.setdefault(name, body_schema)
+        return app.openapi_schema
+
+    app.openapi = openapi
@@ -1,15 +1,20 @@
 import os
+import asyncio
+import functools
+import hashlib
 import logging
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlparse
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, FrozenSet
 import uuid
 import re
+import json
 import jwt
+import orjson
 from pathlib import Path
 
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, File, UploadFile
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -21,6 +26,22 @@ from passlib.hash import bcrypt
 # Import our privacy utilities
 from encryption_utils import privacy_encryption
 from gdpr_utils import GDPRCompliance
+from revocation_utils import TokenRevocation
+from rotation_utils import KeyRotationJob
+from export_utils import CsvZipExporter
+from gdpr_job_utils import GDPRJobQueue
+from cleanup_utils import InactiveUserCleanup
+from archive_utils import ResumeArchive
+from audit_utils import AuditWriter
+from consent_utils import ConsentService
+from photo_utils import DATA_URL_PATTERN, PHOTO_SHA_PATTERN, PhotoStore, owned_photo_ids, parse_photo_ref
+from revision_utils import RevisionStore
+from import_utils import ResumeImporter, iter_lines
+from cache_utils import ResumeCache
+from serialization_utils import (changed_fields, compact_dump, etag_matches, install_body_schemas, json_body,
+                                 json_body_openapi, json_response, raw_json_response, shape)
+from write_behind_utils import ResumeWriteBuffer
+from timestamp_utils import Timestamp, TimestampMigration, bson_timestamps, ensure_ttl_index, to_datetime
 
 # ---------------------------
 # Logging (inherits uvicorn formatting)
@@ -85,8 +106,263 @@ def _init_mongo() -> None:
 
 _init_mongo()
 
+# Anonymous resumes expire through a TTL index this long after their last update (0 keeps them)
+ANONYMOUS_RESUME_TTL_DAYS = int(os.getenv("ANONYMOUS_RESUME_TTL_DAYS", "90"))
+# Retention of cleanup_log and gdpr_deletions entries (0 keeps them)
+AUDIT_LOG_RETENTION_DAYS = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", "365"))
+
+# Local data (audit spill file, photos on the local backend) lives outside the source tree
+STATE_DIR = Path(os.getenv("XDG_STATE_HOME", str(Path.home() / ".local" / "state"))) / "atlascv"
+
+# Buffered writes to the audit collections (gdpr_deletions, cleanup_log)
+audit_writer = AuditWriter(
+    db,
+    max_batch=int(os.getenv("AUDIT_BATCH_SIZE", "100")),
+    flush_seconds=float(os.getenv("AUDIT_FLUSH_SECONDS", "2")),
+    write_timeout_seconds=float(os.getenv("AUDIT_WRITE_TIMEOUT_SECONDS", "2")),
+    # Spilled records hold personal data, so they go to the state directory, not the source tree
+    fallback_path=os.getenv("AUDIT_FALLBACK_PATH", str(STATE_DIR / "audit_fallback.ndjson")),
+    collection_mode=os.getenv("AUDIT_COLLECTION_MODE", "standard"),  # standard, capped, timeseries
+    capped_size_bytes=int(os.getenv("AUDIT_CAPPED_SIZE_MB", "256")) * 1024 * 1024,
+    retention_seconds=AUDIT_LOG_RETENTION_DAYS * 86400 or None,
+) if db is not None else None
+
+# Cold storage for resumes whose owner has not touched them in RESUME_ARCHIVE_AFTER_DAYS
+resume_archive = ResumeArchive(
+    db,
+    archive_after_days=int(os.getenv("RESUME_ARCHIVE_AFTER_DAYS", "14")),
+    codec=os.getenv("RESUME_ARCHIVE_CODEC", "zlib"),
+) if db is not None else None
+
+# Cached consent lookups (the cookie banner checks on every page); consents are written synchronously
+consent_service = ConsentService(
+    db,
+    ttl_seconds=float(os.getenv("CONSENT_CACHE_TTL_SECONDS", "30")),
+) if db is not None else None
+
+# Uploaded photos, deduplicated by content; resumes keep only a "photo:<sha256>" reference
+photo_store = PhotoStore(
+    db,
+    privacy_encryption,
+    backend=os.getenv("PHOTO_STORE_BACKEND", "gridfs"),  # gridfs, local
+    local_dir=os.getenv("PHOTO_STORE_DIR", str(STATE_DIR / "photos")),
+    max_bytes=int(os.getenv("PHOTO_MAX_MB", "5")) * 1024 * 1024,
+    thumbnail_size=int(os.getenv("PHOTO_THUMBNAIL_SIZE", "160")),
+) if db is not None else None
+
+# Version history of owned resumes: a full snapshot every REVISION_SNAPSHOT_EVERY revisions, JSON Patch deltas
+# in between. History older than REVISION_COMPACT_AFTER_DAYS is thinned to one revision per day.
+revision_store = RevisionStore(
+    db,
+    privacy_encryption,
+    snapshot_every=int(os.getenv("REVISION_SNAPSHOT_EVERY", "20")),
+    retention_days=int(os.getenv("REVISION_RETENTION_DAYS", "180")),
+    compact_after_days=int(os.getenv("REVISION_COMPACT_AFTER_DAYS", "7")),
+    max_revisions=int(os.getenv("REVISION_MAX_PER_RESUME", "200")),
+) if db is not None and os.getenv("REVISION_HISTORY_ENABLED", "true").lower() == "true" else None
+
+# Coalesces autosave bursts: PUTs persist at most once per RESUME_WRITE_BEHIND_SECONDS (0 writes through).
+# The buffer is per process, so only enable it with a single replica or sticky sessions.
+RESUME_WRITE_BEHIND_SECONDS = float(os.getenv("RESUME_WRITE_BEHIND_SECONDS", "0"))
+resume_buffer = ResumeWriteBuffer(
+    db,
+    window_seconds=RESUME_WRITE_BEHIND_SECONDS,
+    max_pending=int(os.getenv("RESUME_WRITE_BEHIND_MAX_PENDING", "1000")),
+    revisions=revision_store,
+) if db is not None and RESUME_WRITE_BEHIND_SECONDS > 0 else None
+
+# Decrypted resumes served by GET /resumes/{id}; RESUME_CACHE_CHANGE_STREAM evicts other workers' writes
+# as they happen (replica sets only) instead of checking the stored version on every hit
+RESUME_CACHE_ENTRIES = int(os.getenv("RESUME_CACHE_ENTRIES", "2000"))
+resume_cache = ResumeCache(db, max_entries=RESUME_CACHE_ENTRIES) if db is not None and RESUME_CACHE_ENTRIES > 0 else None
+
 # Initialize GDPR compliance helper
-gdpr_compliance = GDPRCompliance(db) if db is not None else None
+gdpr_compliance = GDPRCompliance(
+    db,
+    use_transactions=os.getenv("GDPR_DELETE_USE_TRANSACTION", "false").lower() == "true",
+    archive=resume_archive,
+    audit=audit_writer,
+    consents=consent_service,
+    photos=photo_store,
+) if db is not None else None
+
+# Token revocation list (Mongo + in-memory Bloom filter)
+token_revocation = TokenRevocation(
+    db,
+    refresh_seconds=int(os.getenv("REVOCATION_BLOOM_REFRESH_SECONDS", "30")),
+    rebuild_seconds=int(os.getenv("REVOCATION_BLOOM_REBUILD_SECONDS", "600")),
+    capacity=int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000")),
+) if db is not None else None
+
+# Bulk NDJSON resume import (admin endpoint and import_resumes.py)
+resume_importer = ResumeImporter(
+    db,
+    privacy_encryption,
+    chunk_size=int(os.getenv("RESUME_IMPORT_CHUNK_SIZE", "500")),
+    workers=int(os.getenv("RESUME_IMPORT_WORKERS", str(min(8, os.cpu_count() or 1)))),
+) if db is not None else None
+
+# Re-encryption of stored resumes after an encryption key change
+key_rotation = KeyRotationJob(
+    db,
+    privacy_encryption,
+    batch_size=int(os.getenv("KEY_ROTATION_BATCH_SIZE", "200")),
+    max_docs_per_second=float(os.getenv("KEY_ROTATION_MAX_DOCS_PER_SECOND", "500")),
+    sealed_stores=tuple(store for store in (photo_store, revision_store) if store is not None),
+) if db is not None else None
+
+# Batched deletion of inactive accounts; scheduled only when INACTIVE_USER_CLEANUP_INTERVAL_HOURS is set above 0
+inactive_user_cleanup = InactiveUserCleanup(
+    db,
+    inactive_days=int(os.getenv("INACTIVE_USER_DAYS", "30")),
+    batch_size=int(os.getenv("INACTIVE_USER_CLEANUP_BATCH_SIZE", "500")),
+    audit=audit_writer,
+    photos=photo_store,
+) if db is not None else None
+
+# Online conversion of ISO-string timestamps to BSON datetimes
+timestamp_migration = TimestampMigration(
+    db,
+    batch_size=int(os.getenv("DATETIME_MIGRATION_BATCH_SIZE", "500")),
+    max_docs_per_second=float(os.getenv("DATETIME_MIGRATION_MAX_DOCS_PER_SECOND", "1000")),
+    anonymous_resume_ttl=timedelta(days=ANONYMOUS_RESUME_TTL_DAYS) if ANONYMOUS_RESUME_TTL_DAYS > 0 else None,
+) if db is not None else None
+
+def set_anonymous_expiry(doc: Dict[str, Any]) -> None:
+    """Resumes without an owner expire ANONYMOUS_RESUME_TTL_DAYS after their last update"""
+    if ANONYMOUS_RESUME_TTL_DAYS > 0 and not doc.get("user_id"):
+        doc["expires_at"] = doc["updated_at"] + timedelta(days=ANONYMOUS_RESUME_TTL_DAYS)
+
+async def find_resume(resume_id: str) -> Optional[Dict[str, Any]]:
+    """Look a resume up by id, restoring it from the archive if it was moved there"""
+    if resume_buffer is not None:
+        await resume_buffer.flush_one(resume_id)
+    found = await db.resumes.find_one({"id": resume_id})
+    if found is None and resume_archive is not None:
+        found = await resume_archive.restore(resume_id)
+    return found
+
+async def find_latest_resume(resume_id: str) -> Optional[Dict[str, Any]]:
+    """Like find_resume, but a state still held by the write-behind buffer is returned without flushing it"""
+    found = await resume_buffer.latest(resume_id) if resume_buffer is not None else None
+    return found if found is not None else await find_resume(resume_id)
+
+async def check_photo_ref(photo_url: Optional[str], owner_id: Optional[str]) -> None:
+    """Reject a "photo:" reference to a photo the resume's owner never uploaded"""
+    sha256 = parse_photo_ref(photo_url)
+    if sha256 is not None and photo_store is not None and not await photo_store.owns(sha256, owner_id):
+        raise HTTPException(status_code=400, detail="Unknown photo reference; upload the photo through /api/photos")
+
+async def store_inline_photo(data: "Resume") -> None:
+    """Move an inline base64 photo of an owned resume into the photo store, keeping its reference
+    
+    A "photo:" reference is kept only if the resume's owner owns that photo.
+    """
+    if photo_store is None or not data.contact.photo_url:
+        return
+    await check_photo_ref(data.contact.photo_url, data.user_id)
+    if not data.user_id:
+        return
+    try:
+        data.contact.photo_url = await photo_store.store_inline(data.contact.photo_url, data.user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def resume_content(data: "Resume") -> Dict[str, Any]:
+    """The sections of a resume, normalized the way incoming payloads are read"""
+    # exclude_none matches payload.dict(exclude_none=True), so equal content compares equal
+    return data.dict(include=set(RESUME_SECTIONS), exclude_none=True)
+
+def section_hashes(sections: Dict[str, Any]) -> Dict[str, str]:
+    return {section: privacy_encryption.content_hash(value) for section, value in sections.items()}
+
+def set_content_hashes(doc: Dict[str, Any], data: "Resume") -> None:
+    """Store keyed hashes of every section, and of the whole resume, next to the content"""
+    hashes = section_hashes(resume_content(data))
+    doc["_content_hashes"] = hashes
+    doc["_content_hash"] = privacy_encryption.content_hash(hashes)
+
+def is_unchanged(existing: Dict[str, Any], hashes: Dict[str, str]) -> bool:
+    """Whether every incoming section hashes the same as the stored one"""
+    stored = existing.get("_content_hashes") or {}
+    return all(stored.get(section) == h for section, h in hashes.items())
+
+async def record_revision(resume_id: str, version: int, content: Optional[Dict[str, Any]] = None,
+                          before: Optional[Dict[str, Any]] = None, ops: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Add a saved version of an owned resume to its history; a failure here never fails the save"""
+    if revision_store is None:
+        return
+    try:
+        if not await revision_store.record(resume_id, version, content, before, ops):
+            # Resumes saved before history was kept start it with a snapshot of the stored version
+            found = await db.resumes.find_one({"id": resume_id, "version": version})
+            if found:
+                data = privacy_encryption.decrypt_sensitive_data(found)
+                stored = Resume(**{k: v for k, v in data.items() if k in Resume.model_fields})
+                await revision_store.record(resume_id, version, resume_content(stored))
+    except Exception as e:
+        logger.warning(f"Recording revision {version} of resume {resume_id} failed: {e}")
+
+def stored_resume(existing: Dict[str, Any], sections: Dict[str, Any]) -> Dict[str, Any]:
+    """The stored resume, decrypting only sensitive fields outside the sections the client just sent"""
+    paths = [p for p in privacy_encryption.sensitive_fields if p.split(".", 1)[0].split("[", 1)[0] not in sections]
+    data = {**privacy_encryption.view(existing).materialize(paths), **sections}
+    return shape(Resume, data)
+
+# Clients revalidate with If-None-Match; a 304 is answered without reading the content
+RESUME_CACHE_CONTROL = "private, no-cache"
+# All a resume's ETag is derived from, so it can be checked with a projected read
+RESUME_ETAG_FIELDS = {"_id": 0, "id": 1, "version": 1, "updated_at": 1}
+
+def _etag_stamp(value: Any) -> str:
+    # Mongo keeps milliseconds, so a just-written timestamp must hash as it will be read back
+    value = to_datetime(value)
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+    return str(value)
+
+def resume_etag(doc: Dict[str, Any]) -> str:
+    """ETag of a stored resume state: every content write bumps version and updated_at"""
+    version = doc.get("version") or 0
+    digest = hashlib.sha256(f"{doc.get('id')}:{version}:{_etag_stamp(doc.get('updated_at'))}".encode()).hexdigest()
+    return f'"{version}-{digest[:16]}"'
+
+def resume_list_etag(docs: List[Dict[str, Any]]) -> str:
+    """ETag of a user's resume list, changing when any resume is added, removed or saved"""
+    lines = sorted(f"{doc.get('id')}:{doc.get('version') or 0}:{_etag_stamp(doc.get('updated_at'))}" for doc in docs)
+    return f'"list-{hashlib.sha256(chr(10).join(lines).encode()).hexdigest()[:16]}"'
+
+def resume_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": RESUME_CACHE_CONTROL}
+
+# Sent with every compact save response, changed or not
+RESUME_CHANGE_KEYS = ("id", "version", "updated_at")
+
+def resume_body(body: Dict[str, Any], compact: bool = False, before: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A shaped resume as sent: in full, or compact (schema defaults left out; after a save, only what changed)"""
+    if not compact:
+        return body
+    if before is not None:
+        return changed_fields(Resume, before, body, keep=RESUME_CHANGE_KEYS)
+    return compact_dump(Resume, body)
+
+def check_if_match(request: Request, doc: Dict[str, Any]) -> None:
+    """Reject a write whose If-Match names a state other than the stored one"""
+    if_match = request.headers.get("if-match")
+    if if_match is not None and not etag_matches(if_match, resume_etag(doc), weak=False):
+        raise HTTPException(status_code=412, detail="Resume has changed since it was read")
+
+async def ensure_ttl_indexes() -> None:
+    """TTL indexes replacing scan-based expiry; they only act on BSON datetime values"""
+    await db.resumes.create_index("expires_at", expireAfterSeconds=0)
+    # Time-series audit collections expire on their own; capped ones roll over instead
+    if AUDIT_LOG_RETENTION_DAYS > 0 and audit_writer.collection_mode == "standard":
+        retention = AUDIT_LOG_RETENTION_DAYS * 86400
+        await ensure_ttl_index(db.cleanup_log, "cleanup_date", retention)
+        await ensure_ttl_index(db.gdpr_deletions, "deletion_timestamp", retention)
+
+# Long-running background tasks started on startup, cancelled on shutdown
+_background_tasks: List[asyncio.Task] = []
 
 # ---------------------------
 # Authentication Configuration
@@ -174,15 +450,17 @@ class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: EmailStr
     full_name: str = ""
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    last_login_at: Optional[str] = None
-    last_activity_at: Optional[str] = None
+    created_at: Timestamp = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: Timestamp = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    last_login_at: Optional[Timestamp] = None
+    last_activity_at: Optional[Timestamp] = None
     is_active: bool = True
     role: str = "user"  # "user" or "admin"
 
 class UserInDB(User):
     hashed_password: str
+    # Tokens issued before this epoch timestamp are rejected ("revoke all sessions")
+    tokens_valid_after: Optional[float] = None
 
 class UserSignup(BaseModel):
     email: EmailStr
@@ -214,7 +492,7 @@ class ResumeContact(BaseModel):
     linkedin: str = ""
     website: str = ""
     # Phase 9: Optional fields
-    photo_url: Optional[str] = None  # Photo URL or base64
+    photo_url: Optional[str] = None  # Photo URL or "photo:<sha256>" (inline base64 is moved to the photo store)
     date_of_birth: Optional[str] = None  # For locales that allow/require it
 
 class ResumeEducation(BaseModel):
@@ -271,8 +549,10 @@ class ResumePersonalDetail(BaseModel):
 class Resume(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     locale: str = Field(default="IN")  # IN, US, EU, AU, JP-R, JP-S
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: Timestamp = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    # Incremented on every write; resumes stored before versioning read as 0
+    version: int = 0
     # Phase 10: User association (optional for backward compatibility)
     user_id: Optional[str] = None
     user_email: Optional[str] = None
@@ -305,6 +585,39 @@ class ResumeCreate(BaseModel):
 class ResumeUpdate(ResumeCreate):
     id: str
 
+# Top-level content of a resume, each hashed separately to spot saves that change nothing
+RESUME_SECTIONS = tuple(ResumeCreate.model_fields)
+
+class ResumePatch(ResumeCreate):
+    # Version the client last read; the patch is rejected if the resume has moved on
+    version: int
+
+class ResumePatchResult(BaseModel):
+    id: str
+    version: int
+    updated_at: Timestamp
+
+class ResumeRevision(BaseModel):
+    version: int
+    kind: str  # snapshot, delta
+    created_at: Timestamp
+
+class ResumeSummary(BaseModel):
+    id: str
+    locale: str = "IN"
+    full_name: str = ""
+    created_at: Optional[Timestamp] = None
+    updated_at: Optional[Timestamp] = None
+    ats_score: Optional[int] = None
+
+class PhotoUploadResult(BaseModel):
+    ref: str
+    sha256: str
+    content_type: str
+    size: int
+    width: int
+    height: int
+
 class JDParseInput(BaseModel):
     text: str
 
@@ -316,6 +629,9 @@ class CoverageInput(BaseModel):
     resume: Resume
     jd_keywords: List[str]
 
+class StoredCoverageInput(BaseModel):
+    jd_keywords: List[str]
+
 class SectionCoverage(BaseModel):
     coverage_percent: float
     matched: List[str]
@@ -350,13 +666,16 @@ class PrivacyConsentInput(BaseModel):
 class PrivacyConsentResult(BaseModel):
     user_identifier: str
     has_consent: bool
-    consent_date: Optional[str]
-    consent_version: str
-    consent_types: List[str]
+    consent_date: Optional[Timestamp]
+    consent_version: Optional[str] = None
+    consent_types: List[str] = []
+
+class ConsentBatchInput(BaseModel):
+    user_identifiers: List[str] = Field(..., max_length=500)
 
 class DataExportRequest(BaseModel):
     user_identifier: str  # email or resume ID
-    format: str = "json"  # json, csv (future)
+    format: str = "json"  # json, ndjson, csv
 
 class DataDeletionRequest(BaseModel):
     user_identifier: str  # email or resume ID
@@ -564,6 +883,13 @@ BASIC_RULES_IN = {
     "max_pages": 2,
 }
 
+def scoring_fields(locale: Optional[str]) -> List[str]:
+    """Sensitive fields read by compute_heuristic_score for a locale"""
+    fields = ["contact.full_name", "contact.email"]
+    if locale == "IN":
+        fields.append("contact.phone")
+    return fields
+
 def compute_heuristic_score(resume: Resume) -> Dict[str, Any]:
     score = 100
     hints: List[str] = []
@@ -660,11 +986,13 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
+    issued_at = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = issued_at + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # jti identifies the token on the revocation list; iat is checked against "revoke all"
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -700,19 +1028,42 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         token_data = TokenData(email=email)
     except jwt.PyJWTError:
         raise credentials_exception
+    
+    # Bloom filter fast path: non-revoked tokens older than the last sync never hit the revocation collection
+    jti = payload.get("jti")
+    if jti and token_revocation is not None and await token_revocation.is_revoked(jti, payload.get("iat")):
+        raise credentials_exception
         
     user = await get_user(email=token_data.email)
     if user is None:
         raise credentials_exception
+    # "Revoke all sessions" is checked against the user document we already loaded
+    # iat is whole seconds; a token issued in the second of the revocation stays valid, so logging in right after works
+    if user.tokens_valid_after and payload.get("iat", 0) < int(user.tokens_valid_after):
+        raise credentials_exception
     return User(**user.dict())
 
+async def get_optional_user(request: Request) -> Optional[User]:
+    """Get the current user if a valid bearer token is present, otherwise None"""
+    try:
+        if request.headers.get("authorization"):
+            credentials = HTTPAuthorizationCredentials(
+                scheme="Bearer", 
+                credentials=request.headers.get("authorization").replace("Bearer ", "")
+            )
+            return await get_current_user(credentials)
+    except:
+        # If auth fails, continue without user (for backward compatibility)
+        pass
+    return None
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user and update activity timestamp"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
     # Update last activity timestamp
-    current_time = datetime.now(timezone.utc).isoformat()
+    current_time = datetime.now(timezone.utc)
     await db.users.update_one(
         {"email": current_user.email},
         {"$set": {
@@ -746,7 +1097,7 @@ async def signup(user_data: UserSignup):
     )
     
     # Save to database
-    user_dict = user_in_db.dict()
+    user_dict = bson_timestamps(user_in_db.dict(), "users")
     await db.users.insert_one(user_dict)
     
     # Create access token
@@ -771,7 +1122,7 @@ async def signin(user_credentials: UserSignin):
         )
     
     # Update last login time and activity
-    current_time = datetime.now(timezone.utc).isoformat()
+    current_time = datetime.now(timezone.utc)
     await db.users.update_one(
         {"email": user.email},
         {"$set": {
@@ -810,6 +1161,40 @@ async def refresh_token(current_user: User = Depends(get_current_active_user)):
     
     return Token(access_token=access_token, token_type="bearer", user=current_user)
 
+@api_router.post("/auth/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user),
+):
+    """Revoke the access token used for this request
+
+    Takes effect at once on this worker. Other workers see it on their next
+    revocation sync (REVOCATION_BLOOM_REFRESH_SECONDS, plus a few seconds of
+    overlap) unless the token was issued after their last sync; use
+    /auth/revoke-all when every worker must refuse the token immediately.
+    """
+    payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    jti = payload.get("jti")
+    if not jti:
+        # Tokens issued before revocation support carry no jti; end every session instead
+        return await revoke_all_sessions(current_user)
+    
+    expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+    await token_revocation.revoke(jti, current_user.id, expires_at, reason="logout")
+    return {"message": "Logged out", "revoked_sessions": "current"}
+
+@api_router.post("/auth/revoke-all")
+async def revoke_all_sessions(current_user: User = Depends(get_current_user)):
+    """Revoke every access token issued to the current user so far"""
+    await db.users.update_one(
+        {"id": current_user.id},
+        {"$set": {
+            "tokens_valid_after": int(datetime.now(timezone.utc).timestamp()),
+            "updated_at": datetime.now(timezone.utc)
+        }}
+    )
+    return {"message": "All sessions revoked", "revoked_sessions": "all"}
+
 # -----------------------
 # JD Processing API
 # -----------------------
@@ -824,9 +1209,12 @@ async def parse_jd(input: JDParseInput):
     keywords = expand_aliases(keywords)
     return JDParseResult(keywords=keywords, top_keywords=list({k for k, _ in top}))
 
-@api_router.post("/jd/coverage", response_model=CoverageResult)
-async def jd_coverage(input: CoverageInput):
-    r = input.resume
+@api_router.post("/jd/coverage", response_model=CoverageResult, openapi_extra=json_body_openapi(CoverageInput))
+async def jd_coverage(input: CoverageInput = Depends(json_body(CoverageInput))):
+    return compute_coverage(input.resume, input.jd_keywords)
+
+def compute_coverage(r: Resume, jd_keywords: List[str]) -> CoverageResult:
+    """Match JD keywords against resume sections (contact data is not used)"""
     sections_text = {
         "summary": r.summary or "",
         "skills": " ".join(r.skills or []),
@@ -848,7 +1236,7 @@ async def jd_coverage(input: CoverageInput):
         for t, c in bag.items():
             overall_bag[t] = overall_bag.get(t, 0) + c
 
-    jd_norm = [normalize_token(k) for k in input.jd_keywords]
+    jd_norm = [normalize_token(k) for k in jd_keywords]
     jd_norm = [k for k in jd_norm if k]
     jd_norm = expand_aliases(jd_norm)
     unique_jd = sorted(list(set(jd_norm)))
@@ -916,8 +1304,8 @@ async def get_optional_fields(code: str):
         "labels": preset.get("labels", {})
     }
 
-@api_router.post("/validate", response_model=ValidateResult)
-async def validate_resume(input: ValidateInput):
+@api_router.post("/validate", response_model=ValidateResult, openapi_extra=json_body_openapi(ValidateInput))
+async def validate_resume(input: ValidateInput = Depends(json_body(ValidateInput))):
     r = input.resume
     code = r.locale if r.locale in PRESETS else "IN"
     preset = PRESETS[code]
@@ -1005,129 +1393,585 @@ async def get_locales():
         ]
     }
 
-@api_router.post("/resumes", response_model=Resume)
-async def create_resume(payload: ResumeCreate, request: Request):
-    """Create a new resume. Associates with user if authenticated."""
-    current_user = None
-    # Try to get current user if authorization header is present
-    try:
-        if request.headers.get("authorization"):
-            credentials = HTTPAuthorizationCredentials(
-                scheme="Bearer", 
-                credentials=request.headers.get("authorization").replace("Bearer ", "")
-            )
-            current_user = await get_current_user(credentials)
-    except:
-        # If auth fails, continue without user (for backward compatibility)
-        current_user = None
+@api_router.post("/resumes", response_model=Resume, openapi_extra=json_body_openapi(ResumeCreate))
+async def create_resume(request: Request, payload: ResumeCreate = Depends(json_body(ResumeCreate)), compact: bool = False):
+    """Create a new resume. Associates with user if authenticated. compact=true leaves schema defaults out."""
+    current_user = await get_optional_user(request)
     
-    data = Resume(**{k: v for k, v in payload.dict(exclude_none=True).items()})
+    # The sections are validated already; only the missing ones need Resume's defaults
+    data = Resume.model_construct(**{k: v for k, v in payload if v is not None})
     
     # Associate with user if authenticated
     if current_user:
         data.user_id = current_user.id
         data.user_email = current_user.email
     
-    ats = compute_heuristic_score(data)
-    doc = data.dict()
-    doc["ats"] = ats
+    await store_inline_photo(data)
+    data.version = 1
+    body = data.dict()
+    doc = bson_timestamps(dict(body), "resumes")
+    set_content_hashes(doc, data)
+    doc["ats"] = compute_heuristic_score(data)
+    set_anonymous_expiry(doc)
     
     # Encrypt sensitive fields before storing
     encrypted_doc = privacy_encryption.encrypt_sensitive_data(doc)
     await db.resumes.insert_one(encrypted_doc)
+    if current_user:
+        await record_revision(data.id, data.version, resume_content(data))
     
-    return Resume(**data.dict())
+    # data is already validated; returning a Response skips validating it again as the response_model
+    return json_response(resume_body(body, compact), headers=resume_headers(resume_etag(body)))
 
 @api_router.get("/resumes", response_model=List[Resume])
-async def list_user_resumes(current_user: User = Depends(get_current_active_user)):
-    """List all resumes for the authenticated user"""
+async def list_user_resumes(request: Request, compact: bool = False, current_user: User = Depends(get_current_active_user)):
+    """List all resumes for the authenticated user; If-None-Match is answered from versions alone
+    
+    compact=true leaves out every field still at its schema default, e.g. empty sections.
+    """
+    if resume_buffer is not None:
+        await resume_buffer.flush_owner(current_user.id)
+    await resume_archive.restore_matching({"user_id": current_user.id})
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        versions = await db.resumes.find({"user_id": current_user.id}, RESUME_ETAG_FIELDS).to_list(length=None)
+        etag = resume_list_etag(versions)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=resume_headers(etag))
     cursor = db.resumes.find({"user_id": current_user.id})
+    docs = []
     resumes = []
     
     async for doc in cursor:
+        docs.append(doc)
         # Decrypt sensitive data before returning
-        decrypted_data = privacy_encryption.decrypt_sensitive_data(doc)
-        resume = Resume(**{k: v for k, v in decrypted_data.items() if k in Resume.model_fields})
-        resumes.append(resume)
+        resumes.append(resume_body(shape(Resume, privacy_encryption.view(doc).materialize()), compact))
     
-    return resumes
+    return json_response(resumes, headers=resume_headers(resume_list_etag(docs)))
+
+@api_router.get("/resumes/summaries", response_model=List[ResumeSummary])
+async def list_resume_summaries(current_user: User = Depends(get_current_active_user)):
+    """List the authenticated user's resumes without their content; only the name is decrypted"""
+    if resume_buffer is not None:
+        await resume_buffer.flush_owner(current_user.id)
+    await resume_archive.restore_matching({"user_id": current_user.id})
+    cursor = db.resumes.find(
+        {"user_id": current_user.id},
+        {"_id": 0, "id": 1, "locale": 1, "created_at": 1, "updated_at": 1, "ats.score": 1,
+         "contact.full_name": 1, "_sealed.contact": 1, "_encrypted": 1},
+    )
+    summaries = []
+    
+    async for doc in cursor:
+        view = privacy_encryption.view(doc)
+        summaries.append(shape(ResumeSummary, {
+            "id": doc["id"],
+            "locale": doc.get("locale", "IN"),
+            "full_name": view.get("contact.full_name") or "",
+            "created_at": doc.get("created_at"),
+            "updated_at": doc.get("updated_at"),
+            "ats_score": (doc.get("ats") or {}).get("score"),
+        }))
+    
+    return json_response(summaries)
 
-@api_router.put("/resumes/{resume_id}", response_model=Resume)
-async def update_resume(resume_id: str, payload: ResumeCreate):
-    existing = await db.resumes.find_one({"id": resume_id})
+@api_router.put("/resumes/{resume_id}", response_model=Resume, openapi_extra=json_body_openapi(ResumeCreate))
+async def update_resume(resume_id: str, request: Request, payload: ResumeCreate = Depends(json_body(ResumeCreate)),
+                        compact: bool = False):
+    """Replace a resume's sections; with If-Match, only if it is still the state the client read
+    
+    compact=true answers with only the fields the save changed, plus id, version and updated_at.
+    """
+    existing = await find_latest_resume(resume_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Resume not found")
+    # Before anything is decrypted, so a stale overwrite costs one read
+    check_if_match(request, existing)
+    
+    changes = payload.dict(exclude_none=True)
+    # Autosave fires on focus changes and re-imports too; skip the write when nothing changed
+    if is_unchanged(existing, section_hashes(changes)):
+        # A compact answer only carries id, version and updated_at, so nothing needs decrypting
+        unchanged = shape(Resume, existing) if compact else stored_resume(existing, changes)
+        return json_response(resume_body(unchanged, compact, unchanged), headers=resume_headers(resume_etag(existing)))
     
     # Decrypt existing data for merging
     decrypted_existing = privacy_encryption.decrypt_sensitive_data(existing)
     
-    merged = {**decrypted_existing, **payload.dict(exclude_none=True)}
-    merged["updated_at"] = datetime.now(timezone.utc).isoformat()
+    merged = {**decrypted_existing, **changes}
+    merged["updated_at"] = datetime.now(timezone.utc)
+    merged["version"] = existing.get("version", 0) + 1
     data = Resume(**{k: v for k, v in merged.items() if k in Resume.model_fields})
+    previous = shape(Resume, decrypted_existing) if compact else None
+    await store_inline_photo(data)
+    merged["contact"] = data.contact.dict()
     ats = compute_heuristic_score(data)
     merged["ats"] = ats
+    bson_timestamps(merged, "resumes")
+    set_anonymous_expiry(merged)
+    set_content_hashes(merged, data)
+    
+    content = before = None
+    if revision_store is not None and data.user_id:
+        content = resume_content(data)
+        before = resume_content(Resume(**{k: v for k, v in decrypted_existing.items() if k in Resume.model_fields}))
     
     # Encrypt before storing
     encrypted_merged = privacy_encryption.encrypt_sensitive_data(merged)
-    await db.resumes.update_one({"id": resume_id}, {"$set": encrypted_merged})
+    if resume_cache is not None:
+        resume_cache.invalidate(resume_id)
+    if resume_buffer is not None:
+        if not resume_buffer.put(resume_id, encrypted_merged, existing.get("version"), content, before):
+            raise HTTPException(status_code=409, detail="Resume was modified by another request")
+        return json_response(resume_body(data.dict(), compact, previous), headers=resume_headers(resume_etag(merged)))
+    # Only if nobody wrote since the read above; otherwise one of two concurrent saves would be lost
+    result = await db.resumes.update_one({"id": resume_id, "version": existing.get("version")}, {"$set": encrypted_merged})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Resume was modified by another request")
+    if content is not None:
+        await record_revision(resume_id, data.version, content, before)
+    
+    return json_response(resume_body(data.dict(), compact, previous), headers=resume_headers(resume_etag(merged)))
+
+def prepare_imported_resume(record: Dict[str, Any], owner: "User", owned_photos: FrozenSet[str] = frozenset()) -> Dict[str, Any]:
+    """Validate and score one imported resume, as POST /resumes would; runs in an import worker thread
+    
+    owned_photos are the photos the owner uploaded, the only ones a resume may reference.
+    """
+    contact = record.get("contact")
+    photo_url = contact.get("photo_url") if isinstance(contact, dict) else None
+    if isinstance(photo_url, str) and DATA_URL_PATTERN.match(photo_url):
+        raise ValueError("Inline photos are not imported; upload them through /api/photos")
+    sha256 = parse_photo_ref(photo_url)
+    if sha256 is not None and sha256 not in owned_photos:
+        raise ValueError("Unknown photo reference; the owner has not uploaded this photo")
+    data = Resume(**ResumeCreate(**record).dict(exclude_none=True))
+    data.user_id = owner.id
+    data.user_email = owner.email
+    data.version = 1
+    doc = bson_timestamps(data.dict(), "resumes")
+    set_content_hashes(doc, data)
+    doc["ats"] = compute_heuristic_score(data)
+    return doc
+
+def _version_filter(version: int) -> Dict[str, Any]:
+    # Resumes stored before versioning have no version field
+    return {"version": {"$in": [0, None]}} if version == 0 else {"version": version}
+
+@api_router.patch("/resumes/{resume_id}", response_model=ResumePatchResult, openapi_extra=json_body_openapi(ResumePatch))
+async def patch_resume(resume_id: str, request: Request, response: Response,
+                       payload: ResumePatch = Depends(json_body(ResumePatch))):
+    """Replace the given sections of a resume, provided it is still at payload.version
     
-    return data
+    A normal edit is one conditional write with no prior read: only the sent sections
+    are re-encrypted and $set, and the stored ATS score is dropped until the next /score.
+    A patch that changes nothing matches no document and is answered from a read.
+    An If-Match header adds one projected read of the version, nothing is decrypted.
+    """
+    changes = payload.dict(exclude_none=True, exclude={"version"})
+    if not changes:
+        raise HTTPException(status_code=400, detail="No sections to update")
+    photo_url = (changes.get("contact") or {}).get("photo_url")
+    if photo_url and DATA_URL_PATTERN.match(photo_url):
+        raise HTTPException(status_code=400, detail="Upload photos through /api/photos")
+    if parse_photo_ref(photo_url) is not None:
+        owner = await db.resumes.find_one({"id": resume_id}, {"_id": 0, "user_id": 1}) or await find_resume(resume_id)
+        if not owner:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        await check_photo_ref(photo_url, owner.get("user_id"))
+    if resume_buffer is not None:
+        await resume_buffer.flush_one(resume_id)
+    if request.headers.get("if-match") is not None:
+        current = await db.resumes.find_one({"id": resume_id}, RESUME_ETAG_FIELDS) or await find_resume(resume_id)
+        if not current:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        check_if_match(request, current)
+    
+    now = datetime.now(timezone.utc)
+    version = payload.version + 1
+    response.headers.update(resume_headers(resume_etag({"id": resume_id, "version": version, "updated_at": now})))
+    hashes = section_hashes(changes)
+    update, unset = privacy_encryption.encrypt_changes(resume_id, changes)
+    update.update({"updated_at": now, "version": version})
+    update.update({f"_content_hashes.{section}": h for section, h in hashes.items()})
+    patched = await db.resumes.find_one_and_update(
+        # Anonymous resumes (their expiry moves) and resumes under an older key take the full rewrite below
+        {"id": resume_id, **_version_filter(payload.version),
+         "_key_id": privacy_encryption.active_key_id, "expires_at": {"$exists": False},
+         "$or": [{f"_content_hashes.{section}": {"$ne": h}} for section, h in hashes.items()]},
+        # The whole-resume hash would need the other sections; the next full write restores it
+        {"$set": update, "$unset": {"ats": "", "_content_hash": "", **{path: "" for path in unset}}},
+        projection={"_id": 0, "user_id": 1},
+    )
+    if patched is not None:
+        if resume_cache is not None:
+            resume_cache.invalidate(resume_id)
+        if patched.get("user_id"):
+            # The sent sections replace the stored ones, so the delta is one add per section
+            await record_revision(resume_id, version, ops=[
+                {"op": "add", "path": f"/{section}", "value": value} for section, value in changes.items()
+            ])
+        return ResumePatchResult(id=resume_id, version=version, updated_at=now)
+    
+    existing = await find_resume(resume_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    if existing.get("version", 0) != payload.version:
+        raise HTTPException(status_code=409, detail=f"Resume is at version {existing.get('version', 0)}")
+    if is_unchanged(existing, hashes):
+        response.headers.update(resume_headers(resume_etag(existing)))
+        return ResumePatchResult(id=resume_id, version=payload.version, updated_at=existing["updated_at"])
+    
+    decrypted_existing = privacy_encryption.decrypt_sensitive_data(existing)
+    merged = {**decrypted_existing, **changes, "updated_at": now, "version": version}
+    data = Resume(**{k: v for k, v in merged.items() if k in Resume.model_fields})
+    merged["ats"] = compute_heuristic_score(data)
+    bson_timestamps(merged, "resumes")
+    set_anonymous_expiry(merged)
+    set_content_hashes(merged, data)
+    result = await db.resumes.update_one(
+        {"id": resume_id, **_version_filter(payload.version)},
+        {"$set": privacy_encryption.encrypt_sensitive_data(merged)},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Resume was modified by another request")
+    if resume_cache is not None:
+        resume_cache.invalidate(resume_id)
+    if data.user_id:
+        before = Resume(**{k: v for k, v in decrypted_existing.items() if k in Resume.model_fields})
+        await record_revision(resume_id, version, resume_content(data), resume_content(before))
+    return ResumePatchResult(id=resume_id, version=version, updated_at=now)
 
 @api_router.get("/resumes/{resume_id}", response_model=Resume)
-async def get_resume(resume_id: str):
-    found = await db.resumes.find_one({"id": resume_id})
+async def get_resume(resume_id: str, request: Request, compact: bool = False):
+    """A resume; If-None-Match naming the stored state is answered 304 without decrypting
+    
+    compact=true leaves out every field still at its schema default.
+    """
+    if resume_buffer is not None:
+        # ETags and the cache are checked against Mongo, so buffered saves go there first
+        await resume_buffer.flush_one(resume_id)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = await db.resumes.find_one({"id": resume_id}, RESUME_ETAG_FIELDS)
+        if current is not None and etag_matches(if_none_match, resume_etag(current)):
+            return Response(status_code=304, headers=resume_headers(resume_etag(current)))
+    if resume_cache is not None:
+        cached = await resume_cache.get(resume_id)
+        if cached is not None:
+            body, etag = cached
+            if compact:
+                return json_response(resume_body(orjson.loads(body), compact), headers=resume_headers(etag))
+            return raw_json_response(body, headers=resume_headers(etag))
+        token = resume_cache.token()
+    found = await find_resume(resume_id)
     if not found:
         raise HTTPException(status_code=404, detail="Resume not found")
     
     # Decrypt sensitive data before returning
-    decrypted_data = privacy_encryption.decrypt_sensitive_data(found)
-    return Resume(**{k: v for k, v in decrypted_data.items() if k in Resume.model_fields})
+    etag = resume_etag(found)
+    body = shape(Resume, privacy_encryption.view(found).materialize())
+    response = json_response(body, headers=resume_headers(etag))
+    if resume_cache is not None:
+        # The encoded body is cached, so a hit skips serialization too
+        resume_cache.put(resume_id, found.get("version", 0), (response.body, etag), found.get("_id"), token)
+    return json_response(resume_body(body, compact), headers=resume_headers(etag)) if compact else response
+
+@api_router.delete("/resumes/{resume_id}")
+async def delete_resume(resume_id: str, request: Request):
+    """Delete a resume and its history; an owned resume only by its owner, and with If-Match only if unchanged"""
+    if resume_buffer is not None and request.headers.get("if-match") is not None:
+        await resume_buffer.flush_one(resume_id)
+    projection = {**RESUME_ETAG_FIELDS, "user_id": 1}
+    owner = await db.resumes.find_one({"id": resume_id}, projection)
+    if owner is None:
+        owner = await db.resumes_archive.find_one({"id": resume_id}, projection)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    if owner.get("user_id"):
+        current_user = await get_optional_user(request)
+        if current_user is None or current_user.id != owner["user_id"]:
+            raise HTTPException(status_code=404, detail="Resume not found")
+    check_if_match(request, owner)
+    
+    if resume_buffer is not None:
+        await resume_buffer.discard(resume_id)
+    await db.resumes.delete_one({"id": resume_id})
+    await db.resumes_archive.delete_one({"id": resume_id})
+    await db.resume_revisions.delete_many({"resume_id": resume_id})
+    if resume_cache is not None:
+        resume_cache.invalidate(resume_id)
+    return {"message": "Resume deleted", "id": resume_id}
+
+async def find_owned_resume(resume_id: str, current_user: "User") -> Dict[str, Any]:
+    """The resume if the user owns it; history is only kept (and shown) for owned resumes"""
+    found = await find_latest_resume(resume_id)
+    if not found or found.get("user_id") != current_user.id:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    return found
+
+@api_router.get("/resumes/{resume_id}/revisions", response_model=List[ResumeRevision])
+async def list_resume_revisions(resume_id: str, current_user: User = Depends(get_current_active_user)):
+    """Saved versions of a resume, newest first"""
+    if revision_store is None:
+        raise HTTPException(status_code=503, detail="Revision history is disabled")
+    await find_owned_resume(resume_id, current_user)
+    if resume_buffer is not None:
+        await resume_buffer.flush_one(resume_id)
+    return [ResumeRevision(**revision) for revision in await revision_store.list(resume_id)]
+
+async def resume_at_version(resume_id: str, version: int, current_user: "User") -> Resume:
+    if revision_store is None:
+        raise HTTPException(status_code=503, detail="Revision history is disabled")
+    found = await find_owned_resume(resume_id, current_user)
+    reconstructed = await revision_store.reconstruct(resume_id, version)
+    if reconstructed is None:
+        raise HTTPException(status_code=404, detail=f"Version {version} is not in the resume history")
+    content, revision = reconstructed
+    return Resume(**content, id=resume_id, version=version, user_id=found.get("user_id"),
+                  user_email=found.get("user_email"), created_at=found.get("created_at"),
+                  updated_at=revision["created_at"])
+
+@api_router.get("/resumes/{resume_id}/revisions/{version}", response_model=Resume)
+async def get_resume_revision(resume_id: str, version: int, current_user: User = Depends(get_current_active_user)):
+    """A resume as it was saved at a given version"""
+    return await resume_at_version(resume_id, version, current_user)
+
+@api_router.post("/resumes/{resume_id}/revisions/{version}/restore", response_model=Resume)
+async def restore_resume_revision(resume_id: str, version: int, request: Request,
+                                  current_user: User = Depends(get_current_active_user)):
+    """Save an earlier version as the newest one; the versions in between stay in the history
+    
+    Like PUT, an If-Match header makes the restore conditional on the current state.
+    """
+    previous = await resume_at_version(resume_id, version, current_user)
+    return await update_resume(resume_id, request, ResumeCreate(**previous.dict(include=set(RESUME_SECTIONS))))
 
 @api_router.post("/resumes/{resume_id}/score")
 async def score_resume(resume_id: str):
-    found = await db.resumes.find_one({"id": resume_id})
+    found = await find_latest_resume(resume_id)
     if not found:
         raise HTTPException(status_code=404, detail="Resume not found")
     
-    # Decrypt sensitive data for scoring
-    decrypted_data = privacy_encryption.decrypt_sensitive_data(found)
+    # Decrypt only the contact fields the score looks at
+    decrypted_data = privacy_encryption.view(found).materialize(scoring_fields(found.get("locale")))
     data = Resume(**{k: v for k, v in decrypted_data.items() if k in Resume.model_fields})
-    return compute_heuristic_score(data)
+    ats = compute_heuristic_score(data)
+    if found.get("ats") != ats:
+        # PATCH drops the stored score; keep it for summaries unless the resume changed meanwhile
+        await db.resumes.update_one({"id": resume_id, "version": found.get("version")}, {"$set": {"ats": ats}})
+    return ats
+
+@api_router.post("/resumes/{resume_id}/coverage", response_model=CoverageResult)
+async def stored_resume_coverage(resume_id: str, input: StoredCoverageInput):
+    """JD coverage for a stored resume; coverage never reads contact data, so nothing is decrypted"""
+    found = await find_resume(resume_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    
+    data = privacy_encryption.view(found).materialize([])
+    return compute_coverage(Resume(**{k: v for k, v in data.items() if k in Resume.model_fields}), input.jd_keywords)
+
+# -----------------------
+# Photos
+# -----------------------
+# Content-addressed, so a photo's bytes never change under its URL
+PHOTO_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+@api_router.post("/photos", response_model=PhotoUploadResult, status_code=201)
+async def upload_photo(file: UploadFile = File(...), current_user: User = Depends(get_current_active_user)):
+    """Store a resume photo; put the returned ref in contact.photo_url"""
+    data = await file.read(photo_store.max_bytes + 1)
+    if len(data) > photo_store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Photo exceeds {photo_store.max_bytes // (1024 * 1024)} MB")
+    try:
+        return await photo_store.put(data, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _photo_response(sha256: str, request: Request, thumbnail: bool, current_user: "User") -> Response:
+    # Only accounts that uploaded the photo can read it; resumes can only reference their owner's photos
+    if not PHOTO_SHA_PATTERN.match(sha256) or not await photo_store.owns(sha256, current_user.id):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    etag = f'"{sha256}{"-thumb" if thumbnail else ""}"'
+    headers = {"ETag": etag, "Cache-Control": PHOTO_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    found = await photo_store.get(sha256, thumbnail=thumbnail)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    content, media_type = found
+    return Response(content=content, media_type=media_type, headers=headers)
+
+@api_router.get("/photos/{sha256}")
+async def get_photo(sha256: str, request: Request, current_user: User = Depends(get_current_active_user)):
+    return await _photo_response(sha256, request, thumbnail=False, current_user=current_user)
+
+@api_router.get("/photos/{sha256}/thumbnail")
+async def get_photo_thumbnail(sha256: str, request: Request, current_user: User = Depends(get_current_active_user)):
+    return await _photo_response(sha256, request, thumbnail=True, current_user=current_user)
 
 # -----------------------
 # GDPR and Privacy Compliance Routes
 # -----------------------
+EXPORT_MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "application/zip"}
+EXPORT_FILE_EXTENSIONS = {"json": "json", "ndjson": "ndjson", "csv": "zip"}
+
+# Flattened CSV tables: one row per resume, plus one table per list section
+csv_exporter = CsvZipExporter(
+    db,
+    resume_columns=(
+        ["id", "locale", "created_at", "updated_at", "user_id", "user_email"]
+        + [f"contact.{f}" for f in ResumeContact.model_fields]
+        + ["summary", "skills"]
+        + [f"personal_details.{f}" for f in ResumePersonalDetail.model_fields]
+        + ["ats.score"]
+    ),
+    section_columns={
+        "experience": list(ResumeExperience.model_fields),
+        "education": list(ResumeEducation.model_fields),
+        "projects": list(ResumeProject.model_fields),
+        "certifications": list(ResumeCertification.model_fields),
+        "references": list(ResumeReference.model_fields),
+    },
+    chunk_size=int(os.getenv("CSV_EXPORT_CHUNK_SIZE", "200")),
+) if db is not None else None
+
+GDPR_EXPORT_BATCH_SIZE = int(os.getenv("GDPR_EXPORT_BATCH_SIZE", "50"))
+
+# format -> callable(plan) streaming the export body
+EXPORT_STREAMS = {
+    "json": lambda plan: gdpr_compliance.stream_export(plan, "json", batch_size=GDPR_EXPORT_BATCH_SIZE),
+    "ndjson": lambda plan: gdpr_compliance.stream_export(plan, "ndjson", batch_size=GDPR_EXPORT_BATCH_SIZE),
+    "csv": lambda plan: csv_exporter.stream(plan["resume_filter"]),
+}
+
+# Background GDPR export/deletion jobs; artifacts expire after GDPR_ARTIFACT_TTL_HOURS
+gdpr_jobs = GDPRJobQueue(
+    db,
+    gdpr_compliance,
+    EXPORT_STREAMS,
+    artifact_ttl_hours=int(os.getenv("GDPR_ARTIFACT_TTL_HOURS", "24")),
+    poll_seconds=float(os.getenv("GDPR_JOB_POLL_SECONDS", "2")),
+) if db is not None else None
+
+def _export_filename(user_identifier: str, fmt: str) -> str:
+    return f"atlascv-data-export-{user_identifier}-{datetime.now().strftime('%Y%m%d')}.{EXPORT_FILE_EXTENSIONS[fmt]}"
+
+async def _owner_account(http_request: Request, user_identifier: str) -> Optional[Dict[str, Any]]:
+    """The account record is only exported or deleted for the signed-in owner of the identifier"""
+    current_user = await get_optional_user(http_request)
+    if current_user and user_identifier in (current_user.email, current_user.id):
+        return await db.users.find_one({"id": current_user.id})
+    return None
+
 @api_router.post("/gdpr/export-my-data")
-async def export_user_data(request: DataExportRequest):
-    """Export all user data for GDPR compliance"""
+async def export_user_data(request: DataExportRequest, http_request: Request):
+    """Export all user data for GDPR compliance, streamed as JSON, NDJSON or a ZIP of CSV tables"""
+    if request.format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {request.format}")
+    
+    account = await _owner_account(http_request, request.user_identifier)
+    if resume_buffer is not None:
+        await resume_buffer.flush()
     try:
-        export_data = await gdpr_compliance.export_user_data(request.user_identifier)
-        return JSONResponse(
-            content=export_data,
-            headers={
-                "Content-Disposition": f"attachment; filename=atlascv-data-export-{request.user_identifier}-{datetime.now().strftime('%Y%m%d')}.json"
-            }
-        )
+        plan = await gdpr_compliance.plan_export(request.user_identifier, account)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    filename = _export_filename(request.user_identifier, request.format)
+    return StreamingResponse(
+        EXPORT_STREAMS[request.format](plan),
+        media_type=EXPORT_MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 @api_router.post("/gdpr/delete-my-data")
-async def delete_user_data(request: DataDeletionRequest):
+async def delete_user_data(request: DataDeletionRequest, http_request: Request):
     """Delete all user data for GDPR compliance"""
+    account = await _owner_account(http_request, request.user_identifier)
     try:
         deletion_result = await gdpr_compliance.delete_user_data(
             request.user_identifier, 
-            request.confirmation_token
+            request.confirmation_token,
+            account
         )
         return deletion_result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/gdpr/jobs/export", status_code=202)
+async def submit_export_job(request: DataExportRequest, http_request: Request):
+    """Queue a GDPR export; poll the returned job and download its artifact when completed"""
+    if request.format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {request.format}")
+    
+    account = await _owner_account(http_request, request.user_identifier)
+    return await gdpr_jobs.submit(
+        "export",
+        request.user_identifier,
+        account_id=account["id"] if account else None,
+        export_format=request.format,
+    )
+
+@api_router.post("/gdpr/jobs/delete", status_code=202)
+async def submit_deletion_job(request: DataDeletionRequest, http_request: Request):
+    """Queue a GDPR deletion; the job result carries the deletion log"""
+    account = await _owner_account(http_request, request.user_identifier)
+    return await gdpr_jobs.submit(
+        "deletion",
+        request.user_identifier,
+        account_id=account["id"] if account else None,
+        confirmation_token=request.confirmation_token,
+        reason=request.reason,
+    )
+
+@api_router.get("/gdpr/jobs/{job_id}")
+async def get_gdpr_job(job_id: str):
+    """Report a GDPR job's status and progress"""
+    job = await gdpr_jobs.get_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/gdpr/jobs/{job_id}/events")
+async def stream_gdpr_job_events(job_id: str):
+    """Server-sent events with the job state on every change, closed once the job finishes"""
+    if not await gdpr_jobs.get_status(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        async for job in gdpr_jobs.watch(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(job, default=str)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@api_router.get("/gdpr/jobs/{job_id}/download")
+async def download_gdpr_export(job_id: str):
+    """Download the artifact of a completed export job"""
+    job = await gdpr_jobs.get_status(job_id)
+    if not job or job["type"] != "export":
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail="Export has expired; request a new one")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    
+    filename = _export_filename(job["user_identifier"], job["format"])
+    return StreamingResponse(
+        gdpr_jobs.iter_artifact(job_id),
+        media_type=EXPORT_MEDIA_TYPES[job["format"]],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(job["progress"]["bytes_written"]),
+        },
+    )
+
 @api_router.post("/privacy/consent", response_model=PrivacyConsentResult)
 async def record_privacy_consent(request: PrivacyConsentInput):
     """Record user's privacy policy consent"""
     try:
-        consent_record = await gdpr_compliance.record_privacy_consent(
+        consent_record = await consent_service.record(
             request.user_identifier, 
             request.dict()
         )
@@ -1135,11 +1979,20 @@ async def record_privacy_consent(request: PrivacyConsentInput):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/privacy/consent/batch", response_model=List[PrivacyConsentResult])
+async def get_privacy_consents(request: ConsentBatchInput):
+    """Consent status for many identifiers in one call"""
+    try:
+        statuses = await consent_service.get_many(request.user_identifiers)
+        return [PrivacyConsentResult(**status) for status in statuses]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/privacy/consent/{user_identifier}", response_model=PrivacyConsentResult)
 async def get_privacy_consent(user_identifier: str):
     """Get user's privacy policy consent status"""
     try:
-        consent_data = await gdpr_compliance.get_privacy_policy_acceptance(user_identifier)
+        consent_data = await consent_service.get(user_identifier)
         return PrivacyConsentResult(**consent_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1148,7 +2001,7 @@ async def get_privacy_consent(user_identifier: str):
 async def get_privacy_info(resume_id: str):
     """Get privacy information about stored resume data"""
     try:
-        found = await db.resumes.find_one({"id": resume_id})
+        found = await find_resume(resume_id)
         if not found:
             raise HTTPException(status_code=404, detail="Resume not found")
         
@@ -1186,56 +2039,13 @@ async def update_local_mode_settings(settings: LocalModeSettings):
 async def cleanup_inactive_users():
     """Delete users and their data who have been inactive for more than 1 month"""
     try:
-        # Calculate cutoff date (1 month ago)
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
-        cutoff_iso = cutoff_date.isoformat()
-        
-        # Find inactive users
-        inactive_users_cursor = db.users.find({
-            "$or": [
-                {"last_activity_at": {"$lt": cutoff_iso}},
-                {"last_login_at": {"$lt": cutoff_iso}},
-                {"last_activity_at": None, "last_login_at": None, "created_at": {"$lt": cutoff_iso}}
-            ]
-        })
-        
-        deleted_users = 0
-        deleted_resumes = 0
-        
-        async for user in inactive_users_cursor:
-            user_id = user["id"]
-            user_email = user["email"]
-            
-            # Delete user's resumes
-            resume_result = await db.resumes.delete_many({
-                "$or": [
-                    {"user_id": user_id},
-                    {"user_email": user_email}
-                ]
-            })
-            deleted_resumes += resume_result.deleted_count
-            
-            # Delete user account
-            user_result = await db.users.delete_one({"id": user_id})
-            if user_result.deleted_count > 0:
-                deleted_users += 1
-                
-                # Log the cleanup action
-                await db.cleanup_log.insert_one({
-                    "action": "user_cleanup",
-                    "user_id": user_id,
-                    "user_email": user_email,
-                    "resumes_deleted": resume_result.deleted_count,
-                    "cleanup_date": datetime.now(timezone.utc).isoformat(),
-                    "reason": "inactive_for_1_month"
-                })
-        
-        logger.info(f"Cleanup completed: {deleted_users} users and {deleted_resumes} resumes deleted")
-        return {"deleted_users": deleted_users, "deleted_resumes": deleted_resumes}
-        
+        result = await inactive_user_cleanup.run()
     except Exception as e:
         logger.error(f"Cleanup failed: {str(e)}")
         raise e
+    if result is None:
+        raise HTTPException(status_code=409, detail="A cleanup run is already in progress")
+    return result
 
 @api_router.post("/admin/cleanup-inactive-users")
 async def trigger_cleanup_inactive_users(current_user: User = Depends(get_current_active_user)):
@@ -1246,8 +2056,93 @@ async def trigger_cleanup_inactive_users(current_user: User = Depends(get_curren
     result = await cleanup_inactive_users()
     return result
 
+@api_router.get("/admin/migrations/datetime")
+async def get_datetime_migration_status(current_user: User = Depends(get_current_active_user)):
+    """Progress of the ISO string -> BSON datetime migration (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await timestamp_migration.get_status() or {"status": "not_started"}
+
+@api_router.post("/admin/import/resumes")
+async def import_resumes(request: Request, owner_email: Optional[str] = None,
+                         current_user: User = Depends(get_current_active_user)):
+    """Import resumes from an NDJSON request body, one resume per line (admin only)
+    
+    Resumes belong to owner_email's account, or to the importing admin. The body is
+    streamed, so the corpus is never held in memory; bad lines are reported by number.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    owner = current_user
+    if owner_email:
+        owner = await get_user(owner_email)
+        if not owner:
+            raise HTTPException(status_code=404, detail="Owner account not found")
+    
+    prepare = functools.partial(prepare_imported_resume, owner=owner, owned_photos=await owned_photo_ids(db, owner.id))
+    return await resume_importer.run(iter_lines(request.stream()), prepare)
+
+@api_router.get("/admin/write-behind")
+async def get_write_behind_stats(current_user: User = Depends(get_current_active_user)):
+    """Autosave coalescing counters: saves accepted vs Mongo writes made (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return resume_buffer.stats() if resume_buffer is not None else {"enabled": False}
+
+@api_router.get("/admin/resume-cache")
+async def get_resume_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Resume read cache size and hit rate (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return resume_cache.stats() if resume_cache is not None else {"enabled": False}
+
+@api_router.get("/admin/export/csv")
+async def export_all_resumes_csv(current_user: User = Depends(get_current_active_user)):
+    """Stream every resume as a ZIP of CSV tables (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if resume_buffer is not None:
+        await resume_buffer.flush()
+    filename = f"atlascv-resumes-{datetime.now().strftime('%Y%m%d')}.zip"
+    return StreamingResponse(
+        csv_exporter.stream({}),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+@api_router.post("/admin/key-rotation")
+async def start_key_rotation(current_user: User = Depends(get_current_active_user)):
+    """Start (or resume) re-encrypting all resumes under the active key (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        job = await key_rotation.start()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _background_tasks.append(asyncio.create_task(key_rotation.run(job["id"])))
+    return await key_rotation.get_status(job["id"])
+
+@api_router.get("/admin/key-rotation")
+async def get_key_rotation_status(current_user: User = Depends(get_current_active_user)):
+    """Report progress of the most recent key rotation job (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = await key_rotation.get_status()
+    return {
+        "active_key_id": privacy_encryption.active_key_id,
+        "key_ids": list(privacy_encryption.keys),
+        "job": job,
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
+install_body_schemas(app)
 
 # CORS
 app.add_middleware(
@@ -1261,6 +2156,16 @@ app.add_middleware(
 # ---------------------------
 # Startup / Shutdown
 # ---------------------------
+async def _run_timestamp_migration() -> None:
+    try:
+        status = await timestamp_migration.run()
+        if status is None:
+            logger.info("Datetime migration is running on another worker")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception(f"❌ Datetime migration failed: {e}")
+
 @app.on_event("startup")
 async def _startup_probe():
     logger.info(f"🚀 Starting {app.title} v{app.version}")
@@ -1272,9 +2177,96 @@ async def _startup_probe():
         logger.info(f"✅ MongoDB ping OK on startup: {_redact_conn(MONGO_URI)}")
     except Exception as e:
         logger.exception(f"❌ MongoDB ping failed on startup: {_redact_conn(MONGO_URI)} | error={e}")
+    
+    if audit_writer is not None:
+        try:
+            await audit_writer.ensure_collections()
+        except Exception as e:
+            logger.exception(f"❌ Audit collection setup failed: {e}")
+        _background_tasks.append(asyncio.create_task(audit_writer.run_flush_loop()))
+    
+    if resume_buffer is not None:
+        _background_tasks.append(asyncio.create_task(resume_buffer.run_flush_loop()))
+    
+    if resume_cache is not None and os.getenv("RESUME_CACHE_CHANGE_STREAM", "false").lower() == "true":
+        _background_tasks.append(asyncio.create_task(resume_cache.run_invalidation_loop()))
+    
+    if gdpr_compliance is not None:
+        try:
+            await gdpr_compliance.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ GDPR index creation failed: {e}")
+    
+    if gdpr_jobs is not None:
+        try:
+            await gdpr_jobs.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ GDPR job index creation failed: {e}")
+        _background_tasks.append(asyncio.create_task(gdpr_jobs.run_worker()))
+    
+    if timestamp_migration is not None:
+        try:
+            await ensure_ttl_indexes()
+        except Exception as e:
+            logger.exception(f"❌ TTL index creation failed: {e}")
+        _background_tasks.append(asyncio.create_task(_run_timestamp_migration()))
+    
+    if photo_store is not None:
+        try:
+            await photo_store.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ Photo index creation failed: {e}")
+    
+    if revision_store is not None:
+        try:
+            await revision_store.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ Revision index creation failed: {e}")
+        interval_hours = float(os.getenv("REVISION_COMPACT_INTERVAL_HOURS", "24"))
+        if interval_hours > 0:
+            _background_tasks.append(asyncio.create_task(revision_store.run_schedule(interval_hours * 3600)))
+    
+    if resume_archive is not None:
+        try:
+            await resume_archive.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ Resume archive index creation failed: {e}")
+        interval_hours = float(os.getenv("RESUME_ARCHIVE_INTERVAL_HOURS", "24"))
+        if interval_hours > 0:
+            _background_tasks.append(asyncio.create_task(resume_archive.run_schedule(interval_hours * 3600)))
+    
+    if inactive_user_cleanup is not None:
+        try:
+            await inactive_user_cleanup.ensure_indexes()
+        except Exception as e:
+            logger.exception(f"❌ Cleanup index creation failed: {e}")
+        interval_hours = float(os.getenv("INACTIVE_USER_CLEANUP_INTERVAL_HOURS", "0"))
+        if interval_hours > 0:
+            _background_tasks.append(asyncio.create_task(inactive_user_cleanup.run_schedule(interval_hours * 3600)))
+    
+    if token_revocation is not None:
+        try:
+            await token_revocation.ensure_indexes()
+            revoked = await token_revocation.rebuild()
+            logger.info(f"🔒 Revocation filter loaded with {revoked} entries")
+        except Exception as e:
+            logger.exception(f"❌ Revocation filter load failed: {e}")
+        _background_tasks.append(asyncio.create_task(token_revocation.run_refresh_loop()))
 
 @app.on_event("shutdown")
 async def _shutdown():
+    for task in _background_tasks:
+        task.cancel()
+    if resume_buffer is not None:
+        try:
+            await resume_buffer.flush()
+        except Exception as e:
+            logger.exception(f"❌ Final resume write-behind flush failed: {e}")
+    if audit_writer is not None:
+        try:
+            await audit_writer.flush()
+        except Exception as e:
+            logger.exception(f"❌ Final audit flush failed: {e}")
     try:
         if client:
             client.close()
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Annotated, Any, Dict, List, Optional
+
+from pydantic import BeforeValidator
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from cleanup_utils import LeaseLock
+
+logger = logging.getLogger("uvicorn.error")
+
+# Fields that used to be stored as ISO strings and are now BSON datetimes
+TIMESTAMP_FIELDS: Dict[str, List[str]] = {
+    "resumes": ["created_at", "updated_at"],
+    "users": ["created_at", "updated_at", "last_login_at", "last_activity_at"],
+    "privacy_consents": ["consent_date", "updated_at"],
+    "cleanup_log": ["cleanup_date"],
+    "gdpr_deletions": ["deletion_timestamp"],
+}
+
+MIGRATION_ID = "bson_datetimes"
+
+
+def to_datetime(value: Any) -> Any:
+    """ISO string or naive UTC datetime -> aware datetime; other values pass through"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_iso(value: Any) -> Any:
+    """Datetime -> ISO string; strings (not yet migrated) pass through"""
+    if isinstance(value, datetime):
+        # Mongo hands back naive UTC datetimes
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value
+
+
+# API models keep ISO strings; this reads either representation from Mongo
+Timestamp = Annotated[str, BeforeValidator(to_iso)]
+
+
+def bson_timestamps(doc: Dict[str, Any], collection: str) -> Dict[str, Any]:
+    """Convert a document's timestamp fields to datetimes before writing it"""
+    for field in TIMESTAMP_FIELDS[collection]:
+        if field in doc:
+            doc[field] = to_datetime(doc[field])
+    return doc
+
+
+def before(field: str, cutoff: datetime) -> Dict[str, Any]:
+    """Range filter matching both representations while the migration runs
+
+    BSON comparisons never cross types, so each clause uses its own index range.
+    """
+    return {"$or": [{field: {"$lt": cutoff}}, {field: {"$lt": cutoff.isoformat()}}]}
+
+
+async def ensure_ttl_index(collection, field: str, expire_after_seconds: int) -> None:
+    """Create a TTL index, or change its expiry if it already exists"""
+    try:
+        await collection.create_index(field, expireAfterSeconds=expire_after_seconds)
+    except OperationFailure as e:
+        # IndexOptionsConflict: same key, different expireAfterSeconds
+        if e.code != 85:
+            raise
+        await collection.database.command({
+            "collMod": collection.name,
+            "index": {"keyPattern": {field: 1}, "expireAfterSeconds": expire_after_seconds},
+        })
+
+
+class TimestampMigration:
+    """Online migration of ISO-string timestamps to BSON datetimes, in throttled batches"""
+
+    def __init__(self, db_client, batch_size: int = 500, max_docs_per_second: float = 1000.0,
+                 anonymous_resume_ttl: Optional[timedelta] = None):
+        self.db = db_client
+        self.batch_size = batch_size
+        self.max_docs_per_second = max_docs_per_second
+        # Anonymous resumes written before expiry existed get expires_at backfilled from updated_at
+        self.anonymous_resume_ttl = anonymous_resume_ttl
+        self.lock = LeaseLock(db_client, f"migration:{MIGRATION_ID}")
+
+    def _pending_query(self, fields: List[str]) -> Dict[str, Any]:
+        return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """Convert every collection; returns None if another worker holds the lock"""
+        status = await self.get_status()
+        if status and status.get("status") == "completed":
+            return status
+        if not await self.lock.acquire():
+            return None
+        try:
+            await self.db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {"status": "running", "started_at": datetime.now(timezone.utc)},
+                 "$setOnInsert": {"converted": {}, "checkpoints": {}}},
+                upsert=True,
+            )
+            for collection, fields in TIMESTAMP_FIELDS.items():
+                await self._migrate_collection(collection, fields)
+            await self.db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc)}},
+            )
+            logger.info("BSON datetime migration completed")
+            return await self.get_status()
+        finally:
+            await self.lock.release()
+
+    async def _migrate_collection(self, collection: str, fields: List[str]) -> None:
+        state = await self.db.migrations.find_one({"_id": MIGRATION_ID}, {"checkpoints": 1})
+        checkpoint = (state.get("checkpoints") or {}).get(collection)
+        while True:
+            started = time.monotonic()
+            query = self._pending_query(fields)
+            if checkpoint is not None:
+                query = {**query, "_id": {"$gt": checkpoint}}
+            projection = {field: 1 for field in fields}
+            if collection == "resumes":
+                projection.update({"user_id": 1, "expires_at": 1})
+            batch = await self.db[collection].find(query, projection) \
+                .sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+
+            operations = []
+            for doc in batch:
+                update = {}
+                for field in fields:
+                    value = to_datetime(doc.get(field))
+                    if isinstance(value, datetime):
+                        update[field] = value
+                if (collection == "resumes" and self.anonymous_resume_ttl and not doc.get("user_id")
+                        and "expires_at" not in doc and isinstance(update.get("updated_at"), datetime)):
+                    update["expires_at"] = update["updated_at"] + self.anonymous_resume_ttl
+                if update:
+                    # Only rewrite values that are still the string we read; a concurrent write wins
+                    operations.append(UpdateOne(
+                        {"_id": doc["_id"], **{f: doc[f] for f in update if f in fields}},
+                        {"$set": update},
+                    ))
+            converted = 0
+            if operations:
+                result = await self.db[collection].bulk_write(operations, ordered=False)
+                converted = result.modified_count
+
+            # Unparseable strings stay behind the checkpoint instead of being retried forever
+            checkpoint = batch[-1]["_id"]
+            await self.db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {f"checkpoints.{collection}": checkpoint, "heartbeat_at": datetime.now(timezone.utc)},
+                 "$inc": {f"converted.{collection}": converted}},
+            )
+            if not await self.lock.acquire():
+                raise RuntimeError("Lost the datetime migration lock")
+
+            min_duration = len(batch) / self.max_docs_per_second
+            await asyncio.sleep(max(0.0, min_duration - (time.monotonic() - started)))
+
+    async def get_status(self) -> Optional[Dict[str, Any]]:
+        """Per-collection conversion counts and overall state"""
+        return await self.db.migrations.find_one({"_id": MIGRATION_ID}, {"checkpoints": 0})
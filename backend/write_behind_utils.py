@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ResumeWriteBuffer:
+    """Write-behind buffer for resume saves: keeps the latest state per resume in memory
+    and persists it at most once per window
+
+    Each entry holds the encrypted document as it would be $set, plus the version
+    stored in Mongo when buffering started; the flush is conditional on that version,
+    so a concurrent write from elsewhere is never overwritten. Entries are flushed on
+    the window, when max_pending resumes are waiting, on read-through and on shutdown.
+    The buffer is per process: replicas need sticky sessions for reads to see it.
+    """
+
+    def __init__(self, db_client, window_seconds: float = 5.0, max_pending: int = 1000, revisions=None):
+        self.db = db_client
+        # RevisionStore; each persisted state is recorded as one revision, coalesced saves in between are not
+        self.revisions = revisions
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        # resume id -> {"doc": encrypted document, "base_version": version stored in Mongo,
+        #               "before"/"content": plaintext sections stored in Mongo / buffered, for revisions}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._writing: set = set()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self.saves = 0
+        self.writes = 0
+        self.dropped = 0
+
+    async def latest(self, resume_id: str) -> Optional[Dict[str, Any]]:
+        """Buffered document of a resume, or None if Mongo already has its latest state"""
+        entry = self._pending.get(resume_id)
+        if entry is None and resume_id in self._writing:
+            # Wait for the in-flight write; a failed one is put back into _pending
+            async with self._flush_lock:
+                entry = self._pending.get(resume_id)
+        return entry["doc"] if entry else None
+
+    def put(self, resume_id: str, doc: Dict[str, Any], read_version: Optional[int],
+            content: Optional[Dict[str, Any]] = None, before: Optional[Dict[str, Any]] = None) -> bool:
+        """Buffer a resume's new state; False if it was read at a version that is no longer the latest
+
+        content and before are the plaintext sections after and before this save,
+        given for resumes that keep a revision history.
+        """
+        entry = self._pending.get(resume_id)
+        if entry is None:
+            self._pending[resume_id] = {"doc": doc, "base_version": read_version, "before": before, "content": content}
+        elif entry["doc"].get("version") != read_version:
+            return False
+        else:
+            entry["doc"] = doc
+            entry["content"] = content
+        self.saves += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+        return True
+
+    async def discard(self, resume_id: str) -> None:
+        """Drop a resume's buffered state, e.g. when it is deleted; an in-flight write is waited for"""
+        self._pending.pop(resume_id, None)
+        if resume_id in self._writing:
+            async with self._flush_lock:
+                self._pending.pop(resume_id, None)
+
+    async def flush_one(self, resume_id: str) -> None:
+        """Persist one resume's buffered state, e.g. before it is read from Mongo"""
+        if resume_id in self._pending or resume_id in self._writing:
+            await self._flush([resume_id])
+
+    async def flush_owner(self, user_id: str) -> None:
+        """Persist every buffered resume of a user, e.g. before listing them"""
+        ids = [rid for rid, entry in self._pending.items() if entry["doc"].get("user_id") == user_id]
+        if ids or self._writing:
+            await self._flush(ids)
+
+    async def flush(self) -> int:
+        """Persist everything buffered; returns the number of resumes written"""
+        return await self._flush(None)
+
+    async def _flush(self, resume_ids: Optional[List[str]]) -> int:
+        async with self._flush_lock:
+            ids = list(self._pending) if resume_ids is None else [rid for rid in resume_ids if rid in self._pending]
+            if not ids:
+                return 0
+            batch: List[Tuple[str, Dict[str, Any]]] = [(rid, self._pending.pop(rid)) for rid in ids]
+            self._writing.update(ids)
+            try:
+                result = await self.db.resumes.bulk_write([
+                    UpdateOne({"id": rid, "version": entry["base_version"]}, {"$set": entry["doc"]})
+                    for rid, entry in batch
+                ], ordered=False)
+            except Exception:
+                # Saves made during the write waited in latest(), so nothing newer exists
+                for rid, entry in batch:
+                    self._pending.setdefault(rid, entry)
+                raise
+            finally:
+                self._writing.difference_update(ids)
+            self.writes += len(batch)
+            if result.matched_count < len(batch):
+                # Deleted, archived or written elsewhere since buffering started; that state wins
+                self.dropped += len(batch) - result.matched_count
+                logger.warning(f"Dropped {len(batch) - result.matched_count} buffered resume saves that no longer match")
+            if self.revisions:
+                await self._record_revisions(batch, result.matched_count == len(batch))
+            return result.matched_count
+
+    async def _record_revisions(self, batch: List[Tuple[str, Dict[str, Any]]], all_written: bool) -> None:
+        batch = [(rid, entry) for rid, entry in batch if entry["content"] is not None]
+        if not batch:
+            return
+        written = None
+        if not all_written:
+            # Tell the persisted entries from the dropped ones by the version and content now stored
+            cursor = self.db.resumes.find({"id": {"$in": [rid for rid, _ in batch]}},
+                                          {"_id": 0, "id": 1, "version": 1, "_content_hash": 1})
+            written = {(doc["id"], doc.get("version"), doc.get("_content_hash")) async for doc in cursor}
+        for rid, entry in batch:
+            version = entry["doc"].get("version")
+            if written is not None and (rid, version, entry["doc"].get("_content_hash")) not in written:
+                continue
+            try:
+                await self.revisions.record(rid, version, content=entry["content"], before=entry["before"])
+            except Exception as e:
+                logger.warning(f"Recording revision {version} of resume {rid} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "pending": len(self._pending),
+            "saves": self.saves,
+            "writes": self.writes,
+            "dropped": self.dropped,
+        }
+
+    async def run_flush_loop(self) -> None:
+        """Flush every window_seconds, or as soon as max_pending resumes are waiting"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Resume write-behind flush failed: {e}")
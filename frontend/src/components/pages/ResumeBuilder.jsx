@@ -262,6 +262,44 @@ export const ResumeBuilder = ({ isAuthenticated, onAuthRequired }) => {
     }
   };
 
+  // Photos need the auth header, so the thumbnail is fetched as a blob rather than linked from <img>
+  const [photoThumbnail, setPhotoThumbnail] = useState("");
+  useEffect(() => {
+    const ref = form.contact.photo_url;
+    if (!isAuthenticated || isLocalMode || !ref?.startsWith("photo:")) {
+      setPhotoThumbnail("");
+      return;
+    }
+    let objectUrl = "";
+    let cancelled = false;
+    axios.get(`${API}/photos/${ref.slice(6)}/thumbnail`, { responseType: "blob" })
+      .then(({ data }) => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(data);
+        setPhotoThumbnail(objectUrl);
+      })
+      .catch(() => !cancelled && setPhotoThumbnail(""));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [form.contact.photo_url, isAuthenticated, isLocalMode]);
+
+  // Upload a photo; the resume keeps only the returned "photo:<sha256>" reference
+  const handlePhotoUpload = async (file) => {
+    if (!file) return;
+    const body = new FormData();
+    body.append("file", file);
+    try {
+      const { data } = await axios.post(`${API}/photos`, body, {
+        headers: { Authorization: `Bearer ${localStorage.getItem('atlascv_token')}` }
+      });
+      handleChange("contact.photo_url", data.ref);
+    } catch (error) {
+      console.error('Photo upload failed:', error);
+    }
+  };
+
   // Handle export for authenticated users
   const handleExport = () => {
     // Export current resume as JSON
@@ -441,6 +479,22 @@ export const ResumeBuilder = ({ isAuthenticated, onAuthRequired }) => {
                       onChange={(e) => handleChange("contact.photo_url", e.target.value)} 
                       placeholder="https://example.com/photo.jpg" 
                     />
+                    {isAuthenticated && !isLocalMode && (
+                      <div className="flex items-center gap-3 mt-2">
+                        {photoThumbnail && (
+                          <img
+                            src={photoThumbnail}
+                            alt="Photo thumbnail"
+                            className="h-12 w-12 rounded object-cover"
+                          />
+                        )}
+                        <Input 
+                          type="file" 
+                          accept="image/jpeg,image/png,image/webp" 
+                          onChange={(e) => handlePhotoUpload(e.target.files?.[0])} 
+                        />
+                      </div>
+                    )}
                   </div>
                 )}
                 {visibleOptionalFields.date_of_birth && (
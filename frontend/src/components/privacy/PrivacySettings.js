@@ -83,6 +83,18 @@ const PrivacySettings = ({ resumeId, userEmail }) => {
     }).catch(error => console.error("Failed to update local mode settings:", error));
   };
 
+  // GDPR export/deletion run as background jobs; poll until one finishes
+  const waitForJob = async (jobId) => {
+    for (;;) {
+      const { data: job } = await axios.get(`${API}/gdpr/jobs/${jobId}`);
+      if (job.status === "completed") return job;
+      if (job.status === "failed" || job.status === "expired") {
+        throw new Error(job.error || `Job ${job.status}`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
   const exportMyData = async () => {
     if (!resumeId && !userEmail) {
       alert("No user identifier available for export");
@@ -91,12 +103,13 @@ const PrivacySettings = ({ resumeId, userEmail }) => {
 
     setIsExporting(true);
     try {
-      const response = await axios.post(
-        `${API}/gdpr/export-my-data`,
-        {
-          user_identifier: resumeId || userEmail,
-          format: "json"
-        },
+      const { data: submitted } = await axios.post(`${API}/gdpr/jobs/export`, {
+        user_identifier: resumeId || userEmail,
+        format: "json"
+      });
+      await waitForJob(submitted.id);
+      const response = await axios.get(
+        `${API}/gdpr/jobs/${submitted.id}/download`,
         { 
           responseType: 'blob' 
         }
@@ -135,12 +148,13 @@ const PrivacySettings = ({ resumeId, userEmail }) => {
 
     setIsDeleting(true);
     try {
-      const response = await axios.post(`${API}/gdpr/delete-my-data`, {
+      const { data: submitted } = await axios.post(`${API}/gdpr/jobs/delete`, {
         user_identifier: resumeId || userEmail,
         reason: "User requested data deletion"
       });
+      const job = await waitForJob(submitted.id);
 
-      alert(`Data deletion completed. ${response.data.total_deleted} records were deleted.`);
+      alert(`Data deletion completed. ${job.result.total_deleted} records were deleted.`);
       
       // Clear local data too
       localStorage.removeItem("atlascv_resume_id");
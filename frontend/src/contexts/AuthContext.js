@@ -118,6 +118,12 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    if (token) {
+      // Revoke the token server-side; local sign-out proceeds regardless
+      axios.post(`${API}/auth/logout`, {}, {
+        headers: { Authorization: `Bearer ${token}` }
+      }).catch(() => {});
+    }
     setToken(null);
     setUser(null);
     localStorage.removeItem('atlascv_token');